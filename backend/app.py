@@ -1,42 +1,93 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from pymongo import MongoClient
 from dotenv import load_dotenv
+from json_provider import BSONJSONProvider
 import os
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.json = BSONJSONProvider(app)
 
 # Configuration
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET', 'your-secret-key-here')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 86400  # 24 hours
 
+# Behind a reverse proxy, trust this many X-Forwarded-For hops so request.remote_addr is the client
+if int(os.getenv('TRUSTED_PROXIES', 0)):
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv('TRUSTED_PROXIES')))
+
 # Initialize extensions
 CORS(app)
 jwt = JWTManager(app)
 
-# MongoDB connection
-try:
-    client = MongoClient(os.getenv('MONGODB_URI'))
-    db = client.get_database()
-    print("✅ Connected to MongoDB successfully")
-except Exception as e:
-    print(f"❌ MongoDB connection error: {e}")
-    db = None
+# Metrics (the command listener must be registered before the MongoClient is created)
+import metrics
+import mongo
+mongo.event_listeners.append(metrics.command_metrics)
+metrics.init_app(app)
+
+# MongoDB connection (shared, lazily created per process)
+from mongo import db, ping, pool_metrics
 
 # Import and register blueprints
 from auth import auth_bp
 from product_routes import product_bp
 from order_routes import order_bp
 from cart_routes import cart_bp
+from ar_routes import ar_bp
+from asset_routes import asset_bp
+from ar_service import ar_service
+from ar_stream import stream_sessions
+from password_hashing import password_hasher, login_throttle
+from catalog_cache import catalog_cache
+from models import product_search, sync_product_search
+from model_assets import model_assets
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(product_bp, url_prefix='/api/products')
 app.register_blueprint(order_bp, url_prefix='/api/orders')
 app.register_blueprint(cart_bp, url_prefix='/api/cart')
+app.register_blueprint(ar_bp, url_prefix='/api/ar')
+app.register_blueprint(asset_bp, url_prefix='/api/assets')
+
+metrics.registry.gauges('mongo_pool', pool_metrics.stats)
+metrics.registry.gauges('password_hashing', password_hasher.stats)
+metrics.registry.gauges('login_throttle', login_throttle.stats)
+metrics.registry.gauges('catalog_cache', catalog_cache.stats)
+metrics.registry.gauges('product_search', product_search.stats)
+metrics.registry.gauges('ar_service', ar_service.stats)
+metrics.registry.gauges('ar_stream_sessions', stream_sessions.stats)
+metrics.registry.gauges('model_assets', model_assets.stats)
+
+def startup():
+    # Kept out of module import so spawned AR workers and WSGI imports never touch the network.
+    # WSGI servers call this once per worker process (e.g. from gunicorn's post_worker_init).
+    try:
+        ping()
+        print("✅ Connected to MongoDB successfully")
+    except Exception as e:
+        print(f"❌ MongoDB connection error: {e}")
+    if os.getenv('ENSURE_INDEXES', '1').lower() in ('1', 'true', 'yes'):
+        try:
+            from models import ensure_indexes
+            created, failed = ensure_indexes()
+            if created:
+                print(f"✅ MongoDB indexes ensured: {', '.join(created)}")
+            for collection, error in failed.items():
+                print(f"❌ MongoDB index creation error on {collection}: {error}")
+        except Exception as e:
+            print(f"❌ MongoDB index creation error: {e}")
+    try:
+        if 'user_id_unique' not in db.carts.index_information():
+            print("❌ carts.user_id_unique is missing; concurrent cart updates can create duplicate carts")
+    except Exception as e:
+        print(f"❌ MongoDB index check error: {e}")
+    if os.getenv('CATALOG_CHANGE_STREAM', '').lower() in ('1', 'true', 'yes'):
+        catalog_cache.watch(db.products, on_change=sync_product_search)
 
 @app.route('/')
 def home():
@@ -44,8 +95,20 @@ def home():
 
 @app.route('/api/health')
 def health_check():
-    return jsonify({"status": "healthy", "database": "connected" if db else "disconnected"})
+    try:
+        ping()
+        database = "connected"
+    except Exception:
+        database = "disconnected"
+    return jsonify({
+        "status": "healthy" if database == "connected" else "degraded",
+        "database": database,
+        "mongo_pool": pool_metrics.stats(),
+        "password_hashing": password_hasher.stats(),
+        "login_throttle": login_throttle.stats()
+    }), 200 if database == "connected" else 503
 
 if __name__ == '__main__':
+    startup()
     port = int(os.getenv('PORT', 5000))
     app.run(debug=True, host='0.0.0.0', port=port)
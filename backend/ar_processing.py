@@ -1,10 +1,80 @@
+import threading
+from collections import OrderedDict
 import cv2
 import mediapipe as mp
 import numpy as np
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional, Sequence, Union
 
-class FaceDetector:
+NUM_FACE_MESH_LANDMARKS = 478
+
+def landmarks_to_array(face_landmarks, width: int, height: int) -> Tuple[np.ndarray, float]:
+    points = face_landmarks.landmark
+    n = len(points)
+    coords = np.fromiter((v for lm in points for v in (lm.x, lm.y, getattr(lm, 'presence', 1.0))), dtype=np.float64, count=3 * n).reshape(n, 3)
+    pixels = (coords[:, :2] * (width, height)).astype(np.int32)
+    return pixels, float(coords[:, 2].mean()) if n else 0.0
+
+def build_camera_matrix(width: int, height: int) -> np.ndarray:
+    focal_length = float(width)
+    return np.array([
+        [focal_length, 0.0, width / 2.0],
+        [0.0, focal_length, height / 2.0],
+        [0.0, 0.0, 1.0]
+    ], dtype=np.float64)
+
+def face_roi(landmarks: np.ndarray, image_shape: Tuple[int, ...], padding: float = 0.1) -> Tuple[int, int, int, int]:
+    h, w = image_shape[:2]
+    x0, y0 = landmarks.min(axis=0)
+    x1, y1 = landmarks.max(axis=0)
+    pad_x = (x1 - x0) * padding
+    pad_y = (y1 - y0) * padding
+    return (
+        int(max(0, x0 - pad_x)),
+        int(max(0, y0 - pad_y)),
+        int(min(w, x1 + pad_x + 1)),
+        int(min(h, y1 + pad_y + 1))
+    )
+
+class FrameBufferPool:
     def __init__(self):
+        self._buffers = {}
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self._buffers[name] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def convert(self, name: str, image: np.ndarray, code: int, channels: int) -> np.ndarray:
+        shape = image.shape[:2] if channels == 1 else image.shape[:2] + (channels,)
+        return cv2.cvtColor(image, code, dst=self.get(name, shape, image.dtype))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+def bbox_landmarks(bbox, width: int, height: int) -> np.ndarray:
+    return np.array([
+        [int(bbox.xmin * width), int(bbox.ymin * height)],
+        [int((bbox.xmin + bbox.width) * width), int(bbox.ymin * height)],
+        [int((bbox.xmin + bbox.width) * width), int((bbox.ymin + bbox.height) * height)],
+        [int(bbox.xmin * width), int((bbox.ymin + bbox.height) * height)],
+        [int((bbox.xmin + bbox.width/2) * width), int(bbox.ymin * height)],
+        [int((bbox.xmin + bbox.width/2) * width), int((bbox.ymin + bbox.height) * height)]
+    ])
+
+def box_iou(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+class FaceDetector:
+    def __init__(self, buffers: Optional[FrameBufferPool] = None, max_faces: int = 4, max_mesh_faces: int = 2,
+                 crop_padding: float = 0.25, track_iou_threshold: float = 0.3, max_track_age: int = 5):
+        # MediaPipe copies its input into its own packet, so one RGB buffer can be reused every frame.
+        self.buffers = buffers or FrameBufferPool()
         self.mp_face_mesh = mp.solutions.face_mesh
         self.mp_face_detection = mp.solutions.face_detection
         self.face_mesh = self.mp_face_mesh.FaceMesh(
@@ -18,41 +88,241 @@ class FaceDetector:
             model_selection=0,
             min_detection_confidence=0.5
         )
+        self.max_faces = max_faces
+        self.max_mesh_faces = max_mesh_faces
+        self.crop_padding = crop_padding
+        self.track_iou_threshold = track_iou_threshold
+        self.max_track_age = max_track_age
+        self.crop_face_mesh = None
+        self.reset_tracks()
+
+    def to_rgb(self, image: np.ndarray, color_order: str = 'bgr') -> np.ndarray:
+        if color_order == 'rgb':
+            return image
+        return self.buffers.convert('rgb', image, cv2.COLOR_BGR2RGB, 3)
 
-    def detect_face_landmarks(self, image: np.ndarray) -> Optional[Tuple[np.ndarray, float]]:
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    def detect_face_landmarks(self, image: np.ndarray, color_order: str = 'bgr') -> Optional[Tuple[np.ndarray, float]]:
+        h, w = image.shape[:2]
+        rgb_image = self.to_rgb(image, color_order)
         results_mesh = self.face_mesh.process(rgb_image)
         if results_mesh.multi_face_landmarks:
-            landmarks = []
-            confidence = 0.0
-            for face_landmarks in results_mesh.multi_face_landmarks:
-                for landmark in face_landmarks.landmark:
-                    h, w, _ = image.shape
-                    x = int(landmark.x * w)
-                    y = int(landmark.y * h)
-                    landmarks.append([x, y])
-                    confidence += getattr(landmark, 'presence', 1.0)
-            if landmarks:
-                confidence /= len(landmarks)
-                return np.array(landmarks), confidence
+            faces = [landmarks_to_array(face_landmarks, w, h) for face_landmarks in results_mesh.multi_face_landmarks]
+            landmarks = np.concatenate([points for points, _ in faces])
+            if len(landmarks):
+                confidence = float(np.mean([presence for _, presence in faces]))
+                return landmarks, confidence
         results_detection = self.face_detection.process(rgb_image)
         if results_detection.detections:
             detection = results_detection.detections[0]
-            bbox = detection.location_data.relative_bounding_box
-            h, w, _ = image.shape
-            landmarks = [
-                [int(bbox.xmin * w), int(bbox.ymin * h)],
-                [int((bbox.xmin + bbox.width) * w), int(bbox.ymin * h)],
-                [int((bbox.xmin + bbox.width) * w), int((bbox.ymin + bbox.height) * h)],
-                [int(bbox.xmin * w), int((bbox.ymin + bbox.height) * h)],
-                [int((bbox.xmin + bbox.width/2) * w), int(bbox.ymin * h)],
-                [int((bbox.xmin + bbox.width/2) * w), int((bbox.ymin + bbox.height) * h)]
-            ]
-            return np.array(landmarks), detection.score[0]
+            return bbox_landmarks(detection.location_data.relative_bounding_box, w, h), detection.score[0]
         return None
 
+    def detect_faces(self, image: np.ndarray, color_order: str = 'bgr') -> List[dict]:
+        # One detector pass plus at most max_mesh_faces crop meshes, largest faces first.
+        h, w = image.shape[:2]
+        rgb_image = self.to_rgb(image, color_order)
+        results_detection = self.face_detection.process(rgb_image)
+        candidates = []
+        for detection in results_detection.detections or []:
+            bbox = detection.location_data.relative_bounding_box
+            box = (
+                max(0, int(bbox.xmin * w)),
+                max(0, int(bbox.ymin * h)),
+                min(w, int((bbox.xmin + bbox.width) * w)),
+                min(h, int((bbox.ymin + bbox.height) * h))
+            )
+            if box[2] > box[0] and box[3] > box[1]:
+                candidates.append((box, bbox, float(detection.score[0])))
+        candidates.sort(key=lambda c: (c[0][2] - c[0][0]) * (c[0][3] - c[0][1]), reverse=True)
+        faces = []
+        for rank, (box, bbox, score) in enumerate(candidates[:self.max_faces]):
+            face = {"bbox": box, "landmarks": None, "confidence": score, "mesh": False}
+            if rank < self.max_mesh_faces:
+                mesh = self._crop_mesh(rgb_image, box)
+                if mesh is not None:
+                    face["landmarks"], face["confidence"] = mesh
+                    face["mesh"] = True
+            if face["landmarks"] is None:
+                face["landmarks"] = bbox_landmarks(bbox, w, h)
+            faces.append(face)
+        self._assign_track_ids(faces)
+        return faces
+
+    def reset_tracks(self):
+        self._tracks = {}
+        self._next_track_id = 1
+
+    def _crop_mesh(self, rgb_image: np.ndarray, box: Tuple[int, int, int, int]) -> Optional[Tuple[np.ndarray, float]]:
+        if self.crop_face_mesh is None:
+            # Crops of different faces are unrelated images, so this mesh runs in static mode.
+            self.crop_face_mesh = self.mp_face_mesh.FaceMesh(
+                static_image_mode=True,
+                max_num_faces=1,
+                refine_landmarks=True,
+                min_detection_confidence=0.5
+            )
+        h, w = rgb_image.shape[:2]
+        pad_x = int((box[2] - box[0]) * self.crop_padding)
+        pad_y = int((box[3] - box[1]) * self.crop_padding)
+        x0, y0 = max(0, box[0] - pad_x), max(0, box[1] - pad_y)
+        x1, y1 = min(w, box[2] + pad_x), min(h, box[3] + pad_y)
+        results_mesh = self.crop_face_mesh.process(np.ascontiguousarray(rgb_image[y0:y1, x0:x1]))
+        if not results_mesh.multi_face_landmarks:
+            return None
+        points, confidence = landmarks_to_array(results_mesh.multi_face_landmarks[0], x1 - x0, y1 - y0)
+        return points + np.array([x0, y0], dtype=points.dtype), confidence
+
+    def _assign_track_ids(self, faces: List[dict]):
+        pairs = sorted(
+            ((box_iou(face["bbox"], track["bbox"]), i, track_id)
+             for i, face in enumerate(faces) for track_id, track in self._tracks.items()),
+            reverse=True
+        )
+        matched_tracks = set()
+        for overlap, i, track_id in pairs:
+            if overlap < self.track_iou_threshold:
+                break
+            if "track_id" in faces[i] or track_id in matched_tracks:
+                continue
+            faces[i]["track_id"] = track_id
+            matched_tracks.add(track_id)
+        for track_id in list(self._tracks):
+            if track_id not in matched_tracks:
+                self._tracks[track_id]["age"] += 1
+                if self._tracks[track_id]["age"] > self.max_track_age:
+                    del self._tracks[track_id]
+        for face in faces:
+            if "track_id" not in face:
+                face["track_id"] = self._next_track_id
+                self._next_track_id += 1
+            self._tracks[face["track_id"]] = {"bbox": face["bbox"], "age": 0}
+
+    def detect_face_landmarks_batch(self, frames: Union[Sequence[np.ndarray], np.ndarray],
+                                    color_order: str = 'bgr') -> Tuple[np.ndarray, np.ndarray]:
+        # Mesh-only: frames without a mesh hit keep zero landmarks and zero confidence,
+        # since the 6-point detection fallback cannot fill a (478, 2) slot.
+        landmarks = np.zeros((len(frames), NUM_FACE_MESH_LANDMARKS, 2), dtype=np.int32)
+        confidences = np.zeros(len(frames), dtype=np.float32)
+        for i, frame in enumerate(frames):
+            h, w = frame.shape[:2]
+            results_mesh = self.face_mesh.process(self.to_rgb(frame, color_order))
+            if results_mesh.multi_face_landmarks:
+                landmarks[i], confidences[i] = landmarks_to_array(results_mesh.multi_face_landmarks[0], w, h)
+        return landmarks, confidences
+
+class LandmarkTracker:
+    def __init__(self, detector: FaceDetector, refresh_interval: int = 5,
+                 min_tracked_ratio: float = 0.9, max_motion: float = 12.0):
+        self.detector = detector
+        self.refresh_interval = refresh_interval
+        self.min_tracked_ratio = min_tracked_ratio
+        self.max_motion = max_motion
+        self.lk_params = dict(
+            winSize=(15, 15),
+            maxLevel=2,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)
+        )
+        self.frames_processed = 0
+        self.frames_skipped = 0
+        self.full_detections = 0
+        self._gray_index = 0
+        self.reset()
+
+    def reset(self):
+        self._prev_gray = None
+        self._prev_points = None
+        self._confidence = 0.0
+        self._frames_since_detection = 0
+
+    def track(self, image: np.ndarray, color_order: str = 'bgr') -> Optional[Tuple[np.ndarray, float]]:
+        self.frames_processed += 1
+        # Alternate between two pooled buffers: the previous gray frame must survive until the flow is computed.
+        self._gray_index ^= 1
+        code = cv2.COLOR_RGB2GRAY if color_order == 'rgb' else cv2.COLOR_BGR2GRAY
+        gray = self.detector.buffers.convert(f'gray{self._gray_index}', image, code, 1)
+        if self._prev_gray is not None and self._prev_gray.shape != gray.shape:
+            # Optical flow needs both frames at the same size, so a resolution change starts over.
+            self.reset()
+        if self._prev_points is not None and self._frames_since_detection < self.refresh_interval:
+            tracked = self._propagate(gray)
+            if tracked is not None:
+                self.frames_skipped += 1
+                return tracked
+        return self._detect(image, gray, color_order)
+
+    def stats(self) -> dict:
+        return {
+            "frames_processed": self.frames_processed,
+            "frames_skipped": self.frames_skipped,
+            "full_detections": self.full_detections,
+            "skip_ratio": self.frames_skipped / self.frames_processed if self.frames_processed else 0.0
+        }
+
+    def _detect(self, image: np.ndarray, gray: np.ndarray, color_order: str) -> Optional[Tuple[np.ndarray, float]]:
+        self.full_detections += 1
+        result = self.detector.detect_face_landmarks(image, color_order)
+        # Only full meshes are propagated; the bbox fallback is re-detected every frame.
+        if result is None or len(result[0]) != NUM_FACE_MESH_LANDMARKS:
+            self.reset()
+            return result
+        landmarks, confidence = result
+        self._prev_gray = gray
+        self._prev_points = landmarks.astype(np.float32).reshape(-1, 1, 2)
+        self._confidence = confidence
+        self._frames_since_detection = 0
+        return result
+
+    def _propagate(self, gray: np.ndarray) -> Optional[Tuple[np.ndarray, float]]:
+        points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, self._prev_points, None, **self.lk_params)
+        if points is None:
+            return None
+        ok = status.reshape(-1).astype(bool)
+        tracked_ratio = float(ok.mean())
+        if tracked_ratio < self.min_tracked_ratio:
+            return None
+        motion = np.linalg.norm((points - self._prev_points).reshape(-1, 2)[ok], axis=1)
+        if np.median(motion) > self.max_motion:
+            return None
+        points[~ok] = self._prev_points[~ok]
+        self._prev_gray = gray
+        self._prev_points = points
+        self._frames_since_detection += 1
+        return points.reshape(-1, 2).astype(np.int32), self._confidence * tracked_ratio
+
+def rvec_to_quaternion(rvec: np.ndarray) -> np.ndarray:
+    rvec = np.asarray(rvec, dtype=np.float64).reshape(3)
+    angle = np.linalg.norm(rvec)
+    if angle < 1e-12:
+        return np.array([1.0, 0.0, 0.0, 0.0])
+    return np.concatenate([[np.cos(angle / 2)], rvec / angle * np.sin(angle / 2)])
+
+def quaternion_to_rvec(quaternion: np.ndarray) -> np.ndarray:
+    w, vector = quaternion[0], quaternion[1:]
+    if w < 0:
+        w, vector = -w, -vector
+    sin_half = np.linalg.norm(vector)
+    if sin_half < 1e-12:
+        return np.zeros((3, 1))
+    return (vector / sin_half * 2.0 * np.arctan2(sin_half, w)).reshape(3, 1)
+
+def slerp_rvec(rvec_from: np.ndarray, rvec_to: np.ndarray, t: float) -> np.ndarray:
+    q0 = rvec_to_quaternion(rvec_from)
+    q1 = rvec_to_quaternion(rvec_to)
+    dot = float(np.dot(q0, q1))
+    # q and -q are the same rotation; take the short way round.
+    if dot < 0:
+        q1, dot = -q1, -dot
+    if dot > 0.9995:
+        q = q0 + t * (q1 - q0)
+    else:
+        theta = np.arccos(dot)
+        q = (np.sin((1 - t) * theta) * q0 + np.sin(t * theta) * q1) / np.sin(theta)
+    return quaternion_to_rvec(q / np.linalg.norm(q))
+
 class HeadPoseEstimator:
-    def __init__(self):
+    KEY_POINT_INDICES = [1, 152, 226, 446, 57, 287]
+
+    def __init__(self, warm_start: bool = True, initial_solver: int = cv2.SOLVEPNP_SQPNP, smoothing: float = 0.5):
         self.face_3d_model = np.array([
             [0.0, 0.0, 0.0],
             [0.0, -330.0, -65.0],
@@ -61,41 +331,202 @@ class HeadPoseEstimator:
             [-150.0, -150.0, -125.0],
             [150.0, -150.0, -125.0]
         ], dtype=np.float64)
+        self.warm_start = warm_start
+        self.initial_solver = initial_solver
+        self.smoothing = smoothing
+        self._camera_matrices = {}
+        self.reset()
 
-    def estimate_pose(self, landmarks: np.ndarray, camera_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
-        key_points_2d = np.array([
-            landmarks[1],
-            landmarks[152],
-            landmarks[226],
-            landmarks[446],
-            landmarks[57],
-            landmarks[287]
-        ], dtype=np.float64)
-        success, rvec, tvec = cv2.solvePnP(
-            self.face_3d_model,
-            key_points_2d,
-            camera_matrix,
-            None,
-            flags=cv2.SOLVEPNP_ITERATIVE
-        )
-        if success:
-            return rvec, tvec
+    def reset(self):
+        self._seed = None
+        self._pose = None
+
+    def camera_matrix_for(self, width: int, height: int) -> np.ndarray:
+        camera_matrix = self._camera_matrices.get((width, height))
+        if camera_matrix is None:
+            camera_matrix = self._camera_matrices[(width, height)] = build_camera_matrix(width, height)
+        return camera_matrix
+
+    def estimate_pose(self, landmarks: np.ndarray, camera_matrix: Optional[np.ndarray] = None,
+                      image_size: Optional[Tuple[int, int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if camera_matrix is None:
+            if image_size is None:
+                raise ValueError("camera_matrix or image_size is required")
+            camera_matrix = self.camera_matrix_for(*image_size)
+        key_points_2d = np.asarray(landmarks, dtype=np.float64)[self.KEY_POINT_INDICES]
+        if self.warm_start and self._seed is not None:
+            success, rvec, tvec = cv2.solvePnP(
+                self.face_3d_model,
+                key_points_2d,
+                camera_matrix,
+                None,
+                rvec=self._seed[0].copy(),
+                tvec=self._seed[1].copy(),
+                useExtrinsicGuess=True,
+                flags=cv2.SOLVEPNP_ITERATIVE
+            )
         else:
+            success, rvec, tvec = cv2.solvePnP(
+                self.face_3d_model,
+                key_points_2d,
+                camera_matrix,
+                None,
+                flags=self.initial_solver
+            )
+        # A face behind the camera means the iterative solve diverged from its seed.
+        if not success or tvec[2, 0] <= 0:
+            self._seed = None
+            if self._pose is not None:
+                return self._pose
             return np.zeros(3), np.zeros(3)
+        if self.warm_start:
+            self._seed = (rvec, tvec)
+        if self._pose is not None and self.smoothing > 0:
+            # Rodrigues vectors near pi flip sign between equivalent solutions, so blend rotations on the sphere.
+            rvec = slerp_rvec(self._pose[0], rvec, 1.0 - self.smoothing)
+            tvec = self.smoothing * self._pose[1] + (1.0 - self.smoothing) * tvec
+        if self.warm_start or self.smoothing > 0:
+            self._pose = (rvec, tvec)
+        return rvec, tvec
+
+class OverlayAsset:
+    def __init__(self, texture: Optional[np.ndarray] = None, points_3d: Optional[np.ndarray] = None,
+                 max_projection_points: int = 64):
+        self.texture = texture
+        self.luminance = 0.0
+        if texture is not None:
+            self.luminance = float(np.mean(cv2.cvtColor(texture, cv2.COLOR_BGR2GRAY)))
+        self.points_3d = None
+        self.projection_points = None
+        if points_3d is not None:
+            self.points_3d = np.asarray(points_3d, dtype=np.float64).reshape(-1, 3)
+            self.projection_points = self.points_3d
+            if len(self.points_3d) > max_projection_points:
+                indices = np.linspace(0, len(self.points_3d) - 1, max_projection_points).astype(np.intp)
+                self.projection_points = np.ascontiguousarray(self.points_3d[indices])
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.texture, self.points_3d]
+        if self.projection_points is not self.points_3d:
+            arrays.append(self.projection_points)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+class OverlayAssetCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._assets = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[OverlayAsset]:
+        with self._lock:
+            asset = self._assets.get(key)
+            if asset is None:
+                self.misses += 1
+                return None
+            self._assets.move_to_end(key)
+            self.hits += 1
+            return asset
+
+    def put(self, key: str, texture: Optional[np.ndarray] = None, points_3d: Optional[np.ndarray] = None) -> OverlayAsset:
+        asset = OverlayAsset(texture, points_3d)
+        with self._lock:
+            self._remove(key)
+            self._assets[key] = asset
+            self._bytes += asset.nbytes
+            while self._bytes > self.max_bytes and len(self._assets) > 1:
+                self._remove(next(iter(self._assets)))
+                self.evictions += 1
+        return asset
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._assets.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._assets),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _remove(self, key: str):
+        asset = self._assets.pop(key, None)
+        if asset is not None:
+            self._bytes -= asset.nbytes
+
+overlay_assets = OverlayAssetCache()
 
 class ARRenderer:
-    def __init__(self, camera_matrix: np.ndarray):
+    LUMA_WEIGHTS_BGR = (0.114, 0.587, 0.299)
+    LUMA_WEIGHTS_RGB = (0.299, 0.587, 0.114)
+
+    def __init__(self, camera_matrix: np.ndarray, asset_cache: Optional[OverlayAssetCache] = None,
+                 luminance_smoothing: float = 0.0, buffers: Optional[FrameBufferPool] = None):
         self.camera_matrix = camera_matrix
         self.dist_coeffs = np.zeros((4, 1))
+        self.asset_cache = asset_cache or overlay_assets
+        self.luminance_smoothing = luminance_smoothing
+        self.scene_luminance = None
+        self.buffers = buffers or FrameBufferPool()
     def project_3d_to_2d(self, points_3d: np.ndarray, rvec: np.ndarray, tvec: np.ndarray) -> np.ndarray:
         points_2d, _ = cv2.projectPoints(points_3d, rvec, tvec, self.camera_matrix, self.dist_coeffs)
         return points_2d.reshape(-1, 2)
-    def apply_lighting_adaptation(self, image: np.ndarray, overlay: np.ndarray) -> np.ndarray:
-        image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        overlay_gray = cv2.cvtColor(overlay, cv2.COLOR_BGR2GRAY)
-        image_mean = np.mean(image_gray)
-        overlay_mean = np.mean(overlay_gray)
+    def project_asset(self, asset_key: str, rvec: np.ndarray, tvec: np.ndarray) -> Optional[np.ndarray]:
+        asset = self.asset_cache.get(asset_key)
+        if asset is None or asset.projection_points is None:
+            return None
+        return self.project_3d_to_2d(asset.projection_points, rvec, tvec)
+    def estimate_scene_luminance(self, image: np.ndarray, roi: Optional[Tuple[int, int, int, int]] = None,
+                                 sample_step: int = 8, color_order: str = 'bgr') -> float:
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            image = image[y0:y1, x0:x1]
+        sample = image[::sample_step, ::sample_step]
+        if sample.size == 0:
+            return self.scene_luminance or 0.0
+        if sample.ndim == 2:
+            luminance = float(sample.mean())
+        else:
+            # The mean of a weighted channel sum is the weighted sum of channel means,
+            # so no grayscale copy of the frame is needed.
+            weights = self.LUMA_WEIGHTS_RGB if color_order == 'rgb' else self.LUMA_WEIGHTS_BGR
+            luminance = sum(weight * float(sample[..., c].mean()) for c, weight in enumerate(weights))
+        if self.scene_luminance is not None and self.luminance_smoothing > 0:
+            luminance = self.luminance_smoothing * self.scene_luminance + (1.0 - self.luminance_smoothing) * luminance
+        self.scene_luminance = luminance
+        return luminance
+    def apply_lighting_adaptation(self, image: np.ndarray, overlay: np.ndarray, asset_key: Optional[str] = None,
+                                  roi: Optional[Tuple[int, int, int, int]] = None, sample_step: Optional[int] = None,
+                                  out: Optional[np.ndarray] = None, color_order: str = 'bgr') -> np.ndarray:
+        if roi is not None or sample_step is not None:
+            image_mean = self.estimate_scene_luminance(image, roi, sample_step or 1, color_order)
+        else:
+            code = cv2.COLOR_RGB2GRAY if color_order == 'rgb' else cv2.COLOR_BGR2GRAY
+            image_mean = np.mean(self.buffers.convert('image_gray', image, code, 1))
+        asset = self.asset_cache.get(asset_key) if asset_key else None
+        if asset is not None and asset.texture is not None:
+            overlay_mean = asset.luminance
+        else:
+            overlay_mean = np.mean(self.buffers.convert('overlay_gray', overlay, cv2.COLOR_BGR2GRAY, 1))
         if overlay_mean > 0:
             ratio = image_mean / overlay_mean
-            overlay = cv2.convertScaleAbs(overlay, alpha=ratio, beta=0)
+            # Pass out=overlay (or a reused buffer) to scale without allocating a new overlay.
+            overlay = cv2.convertScaleAbs(overlay, dst=out, alpha=ratio, beta=0)
+        elif out is not None and out is not overlay:
+            np.copyto(out, overlay)
+            overlay = out
         return overlay
@@ -0,0 +1,101 @@
+from flask import Blueprint, request, jsonify
+from flask_sock import Sock
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from ar_service import ar_service, ARServiceBusy
+from ar_stream import TryOnSession, stream_sessions
+import json
+import os
+
+ar_bp = Blueprint('ar', __name__)
+sock = Sock()
+
+MAX_FRAME_BYTES = int(os.getenv('AR_MAX_FRAME_BYTES', 2 * 1024 * 1024))
+
+@ar_bp.route('/process', methods=['POST'])
+def process_frame():
+    try:
+        frame = request.files.get('frame')
+        frame_bytes = frame.read() if frame else request.get_data()
+        if not frame_bytes:
+            return jsonify({"error": "Frame is required"}), 400
+        if len(frame_bytes) > MAX_FRAME_BYTES:
+            return jsonify({"error": "Frame is too large"}), 413
+        overlay_points = request.form.get('overlay_points') or request.args.get('overlay_points')
+        if overlay_points:
+            try:
+                overlay_points = _parse_overlay_points(overlay_points)
+            except ValueError:
+                return jsonify({"error": "overlay_points must be a JSON list of [x, y, z] points"}), 400
+        multi_face = request.args.get('multi_face', '').lower() in ('1', 'true', 'yes')
+        result = ar_service.process(frame_bytes, overlay_points, multi_face)
+        if "error" in result:
+            return jsonify(result), 400
+        return jsonify(result), 200
+    except ARServiceBusy as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+    except FutureTimeoutError:
+        return jsonify({"error": "AR processing timed out"}), 504
+    except BrokenProcessPool:
+        return jsonify({"error": "AR worker crashed, try again"}), 503, {"Retry-After": "1"}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _parse_overlay_points(value):
+    points = json.loads(value)
+    if not isinstance(points, list) or not points or not all(
+        isinstance(point, list) and len(point) == 3
+        and all(isinstance(c, (int, float)) and not isinstance(c, bool) for c in point)
+        for point in points
+    ):
+        raise ValueError("overlay_points must be a list of [x, y, z] points")
+    return points
+
+@ar_bp.route('/status', methods=['GET'])
+def service_status():
+    return jsonify({**ar_service.stats(), "stream_sessions": stream_sessions.stats()}), 200
+
+@sock.route('/stream', bp=ar_bp)
+def stream_session(ws):
+    if not stream_sessions.acquire():
+        ws.send(json.dumps({"type": "error", "error": "Too many AR stream sessions, try again later"}))
+        # 1013 = Try Again Later
+        ws.close(reason=1013, message="AR stream capacity reached")
+        return
+    try:
+        _stream(ws, TryOnSession())
+    finally:
+        stream_sessions.release()
+
+def _stream(ws, session):
+    while True:
+        message = ws.receive()
+        frame = None
+        # Drain everything already buffered so only the newest frame gets processed.
+        while message is not None:
+            if isinstance(message, str):
+                try:
+                    data = json.loads(message)
+                    if not isinstance(data, dict):
+                        raise ValueError("Messages must be JSON objects")
+                    reply = session.handle_message(data)
+                except (ValueError, TypeError, KeyError):
+                    reply = {"type": "error", "error": "Invalid message"}
+                except Exception as e:
+                    reply = {"type": "error", "error": str(e)}
+                ws.send(json.dumps(reply))
+            elif len(message) > MAX_FRAME_BYTES:
+                ws.send(json.dumps({"type": "error", "error": "Frame is too large"}))
+            else:
+                session.receive_frame()
+                if frame is not None:
+                    session.drop_frame()
+                frame = message
+            message = ws.receive(timeout=0)
+        if frame is not None:
+            # One bad frame gets an error reply; the session keeps going with the next one.
+            try:
+                reply = session.process(frame)
+            except Exception as e:
+                reply = {"type": "error", "error": str(e)}
+            ws.send(json.dumps(reply))
@@ -0,0 +1,190 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import cv2
+import numpy as np
+from ar_processing import FaceDetector, HeadPoseEstimator, ARRenderer, NUM_FACE_MESH_LANDMARKS
+from metrics import record_ar_timings
+
+# Per-process state, created once by the pool initializer so MediaPipe graphs stay warm.
+_detector = None
+_pose_estimator = None
+
+def _init_worker():
+    global _detector, _pose_estimator
+    _detector = FaceDetector()
+    # Frames from different clients share a worker, so no pose state is carried between calls.
+    _pose_estimator = HeadPoseEstimator(warm_start=False, smoothing=0.0)
+
+def _warmup():
+    return os.getpid()
+
+def _pose_fields(landmarks, w, h, overlay_points):
+    if len(landmarks) != NUM_FACE_MESH_LANDMARKS:
+        return {}
+    camera_matrix = _pose_estimator.camera_matrix_for(w, h)
+    rvec, tvec = _pose_estimator.estimate_pose(landmarks, camera_matrix)
+    fields = {
+        "rvec": np.asarray(rvec).reshape(-1).tolist(),
+        "tvec": np.asarray(tvec).reshape(-1).tolist()
+    }
+    if overlay_points is not None:
+        renderer = ARRenderer(camera_matrix)
+        points_3d = np.asarray(overlay_points, dtype=np.float64).reshape(-1, 3)
+        fields["overlay_points"] = renderer.project_3d_to_2d(points_3d, rvec, tvec).tolist()
+    return fields
+
+def process_frame(frame_bytes, overlay_points=None, multi_face=False):
+    # Stage timings travel back under "timings" and are recorded by the parent process.
+    started = time.perf_counter()
+    image = cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return {"error": "Invalid image data"}
+    h, w = image.shape[:2]
+    decoded = time.perf_counter()
+    timings = {"decode": decoded - started}
+    if multi_face:
+        # Requests are independent, so track IDs only identify faces within this frame.
+        _detector.reset_tracks()
+        detected = _detector.detect_faces(image)
+        timings["detect"] = time.perf_counter() - decoded
+        faces = []
+        for face in detected:
+            faces.append({
+                "track_id": face["track_id"],
+                "bbox": list(face["bbox"]),
+                "mesh": face["mesh"],
+                "landmarks": face["landmarks"].tolist(),
+                "confidence": float(face["confidence"]),
+                **_pose_fields(face["landmarks"], w, h, overlay_points)
+            })
+        timings["pose"] = time.perf_counter() - decoded - timings["detect"]
+        timings["total"] = time.perf_counter() - started
+        return {"face_detected": bool(faces), "width": w, "height": h, "faces": faces, "timings": timings}
+    result = _detector.detect_face_landmarks(image)
+    timings["detect"] = time.perf_counter() - decoded
+    if result is None:
+        timings["total"] = time.perf_counter() - started
+        return {"face_detected": False, "width": w, "height": h, "timings": timings}
+    landmarks, confidence = result
+    response = {
+        "face_detected": True,
+        "width": w,
+        "height": h,
+        "landmarks": landmarks.tolist(),
+        "confidence": float(confidence)
+    }
+    response.update(_pose_fields(landmarks, w, h, overlay_points))
+    timings["pose"] = time.perf_counter() - decoded - timings["detect"]
+    timings["total"] = time.perf_counter() - started
+    response["timings"] = timings
+    return response
+
+class ARServiceBusy(Exception):
+    pass
+
+class ARInferenceService:
+    def __init__(self, workers=None, max_pending=None, timeout=None):
+        self.workers = workers or int(os.getenv('AR_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+        self.max_pending = max_pending or int(os.getenv('AR_MAX_PENDING', self.workers * 2))
+        self.timeout = timeout or float(os.getenv('AR_TIMEOUT', 5))
+        self.start_method = os.getenv('AR_START_METHOD', 'spawn')
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = 0
+        self._rejected = 0
+        self._restarts = 0
+        self._lock = threading.Lock()
+        # Spawning and warming the pool takes seconds; a separate lock keeps stats() answering meanwhile.
+        self._start_lock = threading.Lock()
+        self._executor = None
+
+    def start(self):
+        with self._start_lock:
+            executor = self._executor
+            if executor is None:
+                executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker
+                )
+                for future in [executor.submit(_warmup) for _ in range(self.workers)]:
+                    future.result()
+                with self._lock:
+                    self._executor = executor
+            return executor
+
+    def shutdown(self):
+        with self._start_lock:
+            with self._lock:
+                executor, self._executor = self._executor, None
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, frame_bytes, overlay_points=None, multi_face=False):
+        return self._submit(frame_bytes, overlay_points, multi_face)[1]
+
+    def process(self, frame_bytes, overlay_points=None, multi_face=False):
+        started = time.perf_counter()
+        executor, future = self._submit(frame_bytes, overlay_points, multi_face)
+        try:
+            result = future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            # The frame that killed a worker isn't retried; later requests get a fresh pool.
+            self._replace(executor)
+            raise
+        timings = result.pop("timings", None)
+        if timings:
+            timings["queue"] = max(0.0, time.perf_counter() - started - timings["total"])
+            record_ar_timings(timings, "worker")
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "rejected": self._rejected,
+                "restarts": self._restarts,
+                "running": self._executor is not None
+            }
+
+    def _submit(self, frame_bytes, overlay_points, multi_face):
+        executor = self._executor or self.start()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ARServiceBusy("AR service is saturated")
+        with self._lock:
+            self._pending += 1
+        try:
+            try:
+                future = executor.submit(process_frame, frame_bytes, overlay_points, multi_face)
+            except BrokenProcessPool:
+                self._replace(executor)
+                executor = self.start()
+                future = executor.submit(process_frame, frame_bytes, overlay_points, multi_face)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return executor, future
+
+    def _replace(self, executor):
+        # Only the first caller to see a broken pool swaps it out.
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+ar_service = ARInferenceService()
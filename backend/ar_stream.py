@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from ar_processing import FaceDetector, FrameBufferPool, LandmarkTracker, HeadPoseEstimator, ARRenderer, NUM_FACE_MESH_LANDMARKS, OverlayAsset, overlay_assets
+from metrics import record_ar_timings
+from model_assets import product_anchor_points, PRODUCT_ASSET_PREFIX
+
+class StreamSessionLimit:
+    # Every stream session builds its own MediaPipe graphs and runs inference on a request thread.
+    def __init__(self, max_sessions=None):
+        self.max_sessions = max_sessions or int(os.getenv('AR_MAX_STREAM_SESSIONS', max(1, (os.cpu_count() or 2) // 2)))
+        self._slots = threading.BoundedSemaphore(self.max_sessions)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.active += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {"max_sessions": self.max_sessions, "active": self.active, "rejected": self.rejected}
+
+stream_sessions = StreamSessionLimit()
+
+class TryOnSession:
+    def __init__(self):
+        self.buffers = FrameBufferPool()
+        self.tracker = LandmarkTracker(FaceDetector(self.buffers))
+        self.pose_estimator = HeadPoseEstimator()
+        self.overlay_points = None
+        self.asset_key = None
+        self.frame_format = 'encoded'
+        self.frame_size = None
+        self.multi_face = False
+        self._face_estimators = {}
+        self._renderers = {}
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+
+    def handle_message(self, message: dict):
+        if message.get('type') == 'stats':
+            return {"type": "stats", **self.stats()}
+        if 'multi_face' in message:
+            detector = self.tracker.detector
+            max_mesh_faces = detector.max_mesh_faces
+            if 'max_mesh_faces' in message:
+                # Parsed before anything changes, so a bad value leaves the session as it was.
+                value = message['max_mesh_faces']
+                if not isinstance(value, int) or isinstance(value, bool):
+                    return {"type": "error", "error": "max_mesh_faces must be an integer"}
+                max_mesh_faces = max(0, min(value, detector.max_faces))
+            self.multi_face = bool(message['multi_face'])
+            self._face_estimators = {}
+            detector.max_mesh_faces = max_mesh_faces
+            detector.reset_tracks()
+            return {"type": "config", "multi_face": self.multi_face, "max_mesh_faces": detector.max_mesh_faces}
+        if 'frame_format' in message:
+            # Raw RGB frames skip both the decoder and the BGR round-trip.
+            if message['frame_format'] == 'rgb':
+                width, height = message.get('width'), message.get('height')
+                if not all(isinstance(value, int) and not isinstance(value, bool) and value > 0 for value in (width, height)):
+                    return {"type": "error", "error": "rgb frames need positive integer width and height"}
+                self.frame_size = (width, height)
+                self.frame_format = 'rgb'
+            else:
+                self.frame_format = 'encoded'
+            return {"type": "config", "frame_format": self.frame_format}
+        if 'asset_key' in message:
+            if message['asset_key'] is not None and not isinstance(message['asset_key'], str):
+                return {"type": "error", "error": "asset_key must be a string or null"}
+            # Points sent along with a key stay with this session so no client can change what others see.
+            overlay_points = self._session_points(message.get('overlay_points'))
+            # Shared entries are only written server-side (asset manifest, product anchors); clients select them.
+            self.asset_key = message['asset_key'] or None
+            self.overlay_points = overlay_points
+            asset = overlay_assets.get(self.asset_key) if self.asset_key else None
+            if asset is None and self.asset_key and self.asset_key.startswith(PRODUCT_ASSET_PREFIX):
+                points = product_anchor_points(self.asset_key[len(PRODUCT_ASSET_PREFIX):])
+                if points is not None:
+                    asset = overlay_assets.put(self.asset_key, points_3d=points)
+            return {"type": "config", "asset_key": self.asset_key, "cached": asset is not None}
+        if 'overlay_points' in message:
+            self.overlay_points = self._session_points(message['overlay_points'])
+            return {"type": "config", "overlay_points": 0 if self.overlay_points is None else len(self.overlay_points)}
+        return {"type": "error", "error": "Unknown message"}
+
+    def receive_frame(self):
+        self.frames_received += 1
+
+    def drop_frame(self):
+        self.frames_dropped += 1
+
+    def process(self, frame_bytes: bytes) -> dict:
+        started = time.perf_counter()
+        image, color_order = self._decode(frame_bytes)
+        if image is None:
+            return {"type": "error", "error": "Invalid image data"}
+        h, w = image.shape[:2]
+        decoded = time.perf_counter()
+        timings = {"decode": decoded - started}
+        response = {"type": "frame", "frame": self.frames_processed, "face_detected": False}
+        if self.multi_face:
+            self._process_faces(image, color_order, response)
+            timings["faces"] = time.perf_counter() - decoded
+        else:
+            result = self.tracker.track(image, color_order)
+            tracked = time.perf_counter()
+            timings["track"] = tracked - decoded
+            if result is None:
+                self.pose_estimator.reset()
+            else:
+                landmarks, confidence = result
+                response.update(face_detected=True, landmarks=landmarks.tolist(), confidence=float(confidence))
+                response.update(self._pose_fields(landmarks, self.pose_estimator, w, h))
+                timings["pose"] = time.perf_counter() - tracked
+        self.frames_processed += 1
+        timings["total"] = time.perf_counter() - started
+        record_ar_timings(timings, "stream")
+        self.last_latency_ms = timings["total"] * 1000.0
+        self.max_latency_ms = max(self.max_latency_ms, self.last_latency_ms)
+        self._total_latency_ms += self.last_latency_ms
+        response["latency_ms"] = round(self.last_latency_ms, 2)
+        response["dropped_frames"] = self.frames_dropped
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "frames_received": self.frames_received,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "last_latency_ms": round(self.last_latency_ms, 2),
+            "max_latency_ms": round(self.max_latency_ms, 2),
+            "avg_latency_ms": round(self._total_latency_ms / self.frames_processed, 2) if self.frames_processed else 0.0,
+            "tracking": self.tracker.stats(),
+            "buffer_bytes": self.buffers.nbytes
+        }
+
+    def _process_faces(self, image: np.ndarray, color_order: str, response: dict):
+        h, w = image.shape[:2]
+        faces = []
+        estimators = {}
+        # Each tracked face keeps its own warm-started pose estimator while its track lives.
+        for face in self.tracker.detector.detect_faces(image, color_order):
+            estimator = estimators[face["track_id"]] = self._face_estimators.get(face["track_id"]) or HeadPoseEstimator()
+            faces.append({
+                "track_id": face["track_id"],
+                "bbox": list(face["bbox"]),
+                "mesh": face["mesh"],
+                "landmarks": face["landmarks"].tolist(),
+                "confidence": float(face["confidence"]),
+                **self._pose_fields(face["landmarks"], estimator, w, h)
+            })
+        self._face_estimators = estimators
+        response.update(face_detected=bool(faces), faces=faces)
+
+    def _pose_fields(self, landmarks: np.ndarray, estimator: HeadPoseEstimator, w: int, h: int) -> dict:
+        if len(landmarks) != NUM_FACE_MESH_LANDMARKS:
+            return {}
+        renderer = self._renderer_for(w, h)
+        rvec, tvec = estimator.estimate_pose(landmarks, renderer.camera_matrix)
+        fields = {
+            "rvec": np.asarray(rvec).reshape(-1).tolist(),
+            "tvec": np.asarray(tvec).reshape(-1).tolist()
+        }
+        if self.overlay_points is not None:
+            fields["overlay_points"] = renderer.project_3d_to_2d(self.overlay_points, rvec, tvec).tolist()
+        elif self.asset_key is not None:
+            overlay_points = renderer.project_asset(self.asset_key, rvec, tvec)
+            if overlay_points is not None:
+                fields["overlay_points"] = overlay_points.tolist()
+        return fields
+
+    def _session_points(self, points):
+        # An empty list clears the points, same as null; there is nothing to project.
+        if points is None or len(points) == 0:
+            return None
+        # Same downsampling the shared cache applies, so a large upload can't slow every frame.
+        return OverlayAsset(points_3d=np.asarray(points, dtype=np.float64)).projection_points
+
+    def _decode(self, frame_bytes: bytes):
+        if self.frame_format == 'rgb':
+            w, h = self.frame_size
+            if len(frame_bytes) != w * h * 3:
+                return None, 'rgb'
+            image = self.buffers.get('input', (h, w, 3))
+            np.copyto(image, np.frombuffer(frame_bytes, dtype=np.uint8).reshape(h, w, 3))
+            return image, 'rgb'
+        return cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_COLOR), 'bgr'
+
+    def _renderer_for(self, width: int, height: int) -> ARRenderer:
+        renderer = self._renderers.get((width, height))
+        if renderer is None:
+            renderer = self._renderers[(width, height)] = ARRenderer(
+                self.pose_estimator.camera_matrix_for(width, height),
+                buffers=self.buffers
+            )
+        return renderer
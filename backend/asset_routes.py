@@ -0,0 +1,73 @@
+from flask import Blueprint, request, jsonify, send_file, url_for
+from models import Product
+from model_assets import model_assets, product_anchors, PRODUCT_ASSET_PREFIX
+from ar_processing import overlay_assets
+from bson import ObjectId
+from bson.errors import InvalidId
+import numpy as np
+import os
+
+asset_bp = Blueprint('assets', __name__)
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MANIFEST_MAX_AGE = int(os.getenv('MODEL_MANIFEST_MAX_AGE', 300))
+
+@asset_bp.route('/products/<product_id>/manifest', methods=['GET'])
+def product_manifest(product_id):
+    try:
+        product = Product.get_product_by_id(ObjectId(product_id))
+        if not product:
+            return jsonify({"error": "Product not found"}), 404
+        manifest = model_assets.manifest(product.get('model_path'))
+        if manifest is None:
+            return jsonify({"error": "Product has no 3D model"}), 404
+        asset_key = PRODUCT_ASSET_PREFIX + product_id
+        # Anchors are returned in the head-model frame that HeadPoseEstimator poses are expressed in.
+        anchors = product_anchors(product)
+        # Streaming sessions can then select this product's anchors by asset_key without uploading points.
+        if anchors:
+            overlay_assets.put(asset_key, points_3d=np.asarray(anchors['points'], dtype=np.float64))
+        response = jsonify({
+            "product_id": product_id,
+            "asset_key": asset_key,
+            "source": manifest['source'],
+            "source_bytes": manifest['source_bytes'],
+            "lods": {
+                name: {
+                    "url": url_for('assets.model_file', filename=lod['file']),
+                    "bytes": lod['bytes'],
+                    "vertices": lod['vertices'],
+                    "triangles": lod['triangles']
+                }
+                for name, lod in manifest['lods'].items()
+            },
+            "anchors": anchors
+        })
+        response.cache_control.public = True
+        response.cache_control.max_age = MANIFEST_MAX_AGE
+        response.add_etag()
+        return response.make_conditional(request)
+    except InvalidId:
+        return jsonify({"error": "Invalid product ID"}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Model could not be processed: {e}"}), 422
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@asset_bp.route('/models/<filename>', methods=['GET'])
+def model_file(filename):
+    try:
+        path = model_assets.file_path(filename)
+        if path is None:
+            return jsonify({"error": "Model not found"}), 404
+        # File names carry a content hash, so they can be cached forever; conditional=True also serves Range requests.
+        response = send_file(path, mimetype='model/gltf-binary', conditional=True, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@asset_bp.route('/status', methods=['GET'])
+def asset_status():
+    return jsonify(model_assets.stats()), 200
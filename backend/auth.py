@@ -1,10 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from models import User
+from password_hashing import login_throttle, HashingBusy
 from bson import ObjectId
+import math
 
 auth_bp = Blueprint('auth', __name__)
 
+def _throttled(retry_after):
+    return jsonify({"error": "Too many attempts, try again later"}), 429, {"Retry-After": str(math.ceil(retry_after))}
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     try:
@@ -14,8 +19,12 @@ def register():
         name = data.get('name')
         if not all([email, password, name]):
             return jsonify({"error": "All fields are required"}), 400
+        retry_after = login_throttle.check_registration(request.remote_addr)
+        if retry_after:
+            return _throttled(retry_after)
         user_id, error = User.create_user(email, password, name)
         if error:
+            login_throttle.record_failure(request.remote_addr)
             return jsonify({"error": error}), 400
         access_token = create_access_token(identity=str(user_id))
         return jsonify({
@@ -23,6 +32,8 @@ def register():
             "access_token": access_token,
             "user": {"id": user_id, "email": email, "name": name}
         }), 201
+    except HashingBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -34,9 +45,14 @@ def login():
         password = data.get('password')
         if not all([email, password]):
             return jsonify({"error": "Email and password are required"}), 400
+        retry_after = login_throttle.check(request.remote_addr, email)
+        if retry_after:
+            return _throttled(retry_after)
         user, error = User.verify_user(email, password)
         if error:
+            login_throttle.record_failure(request.remote_addr, email)
             return jsonify({"error": error}), 401
+        login_throttle.reset(email)
         access_token = create_access_token(identity=str(user['_id']))
         return jsonify({
             "message": "Login successful",
@@ -48,6 +64,8 @@ def login():
                 "role": user.get('role', 'user')
             }
         }), 200
+    except HashingBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,159 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+import cv2
+import mediapipe as mp
+import numpy as np
+from perf_stats import latency_stats, find_regressions
+from ar_processing import FaceDetector, LandmarkTracker, HeadPoseEstimator, ARRenderer, NUM_FACE_MESH_LANDMARKS, face_roi, landmarks_to_array
+
+DEFAULT_RESOLUTIONS = ["640x480", "1280x720", "1920x1080"]
+
+def parse_resolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def synthetic_frames(width, height, count, seed=0):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+    axes = (width // 8, height // 5)
+    for i in range(count):
+        frame = background.copy()
+        center = (width // 2 + int(10 * np.sin(i / 8)), height // 2 + int(6 * np.cos(i / 11)))
+        cv2.ellipse(frame, center, axes, 0, 0, 360, (120, 160, 210), -1)
+        for side in (-1, 1):
+            eye = (center[0] + side * axes[0] // 2, center[1] - axes[1] // 4)
+            cv2.circle(frame, eye, max(2, axes[0] // 8), (40, 40, 40), -1)
+        cv2.ellipse(frame, (center[0], center[1] + axes[1] // 2), (axes[0] // 3, axes[1] // 10), 0, 0, 180, (60, 60, 150), -1)
+        yield frame
+
+def video_frames(path, width, height, count):
+    capture = cv2.VideoCapture(path)
+    frames = []
+    try:
+        while len(frames) < count:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA))
+    finally:
+        capture.release()
+    if not frames:
+        raise ValueError(f"No frames could be read from {path}")
+    # Loop short recordings so every resolution gets the same sample count.
+    return [frames[i % len(frames)] for i in range(count)]
+
+def synthetic_landmarks(estimator, camera_matrix, count, seed=0):
+    rng = np.random.default_rng(seed)
+    landmarks = []
+    for i in range(count):
+        rvec = np.array([0.05 * np.sin(i / 9), 0.1 * np.sin(i / 13), 0.02], dtype=np.float64) + rng.normal(0, 0.005, 3)
+        tvec = np.array([0.0, 0.0, 1500.0]) + rng.normal(0, 2.0, 3)
+        points, _ = cv2.projectPoints(estimator.face_3d_model, rvec, tvec, camera_matrix, None)
+        frame_landmarks = np.zeros((NUM_FACE_MESH_LANDMARKS, 2), dtype=np.float64)
+        frame_landmarks[HeadPoseEstimator.KEY_POINT_INDICES] = points.reshape(-1, 2)
+        landmarks.append(frame_landmarks)
+    return landmarks
+
+def timed(samples, stage, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.setdefault(stage, []).append(time.perf_counter() - started)
+    return result
+
+def summarize(durations):
+    stats = {"samples": len(durations), **latency_stats(durations, digits=4)}
+    stats["fps"] = round(1000.0 / stats["mean_ms"], 2) if stats["mean_ms"] > 0 else None
+    return stats
+
+def run_resolution(width, height, frames, warmup, video=None):
+    detector = FaceDetector()
+    tracker = LandmarkTracker(FaceDetector())
+    estimator = HeadPoseEstimator()
+    camera_matrix = estimator.camera_matrix_for(width, height)
+    renderer = ARRenderer(camera_matrix)
+    overlay = np.full((height // 6, width // 3, 3), 150, dtype=np.uint8)
+    overlay_out = np.empty_like(overlay)
+    overlay_points = np.random.default_rng(1).normal(0, 80, size=(512, 3))
+    total = frames + warmup
+    source = video_frames(video, width, height, total) if video else synthetic_frames(width, height, total)
+    landmarks = synthetic_landmarks(estimator, camera_matrix, total)
+    samples = {}
+    for i, frame in enumerate(source):
+        if i == warmup:
+            samples = {}
+        rgb = timed(samples, "color_conversion", detector.to_rgb, frame)
+        mesh = timed(samples, "mesh_inference", detector.face_mesh.process, rgb)
+        timed(samples, "fallback_detection", detector.face_detection.process, rgb)
+        timed(samples, "tracking", tracker.track, frame)
+        rvec, tvec = timed(samples, "pnp", estimator.estimate_pose, landmarks[i], camera_matrix)
+        timed(samples, "projection", renderer.project_3d_to_2d, overlay_points, rvec, tvec)
+        timed(samples, "lighting", renderer.apply_lighting_adaptation, frame, overlay)
+        roi = (width // 4, height // 5, 3 * width // 4, 4 * height // 5)
+        if mesh.multi_face_landmarks:
+            roi = face_roi(landmarks_to_array(mesh.multi_face_landmarks[0], width, height)[0], frame.shape)
+        timed(samples, "lighting_roi", renderer.apply_lighting_adaptation, frame, overlay,
+              roi=roi, sample_step=4, out=overlay_out)
+    stats = {stage: summarize(durations) for stage, durations in samples.items()}
+    stats["tracking"]["skip_ratio"] = round(tracker.stats()["skip_ratio"], 4)
+    return stats
+
+def compare(results, baseline, threshold):
+    previous = baseline.get("results", {})
+    return find_regressions((
+        (f"{resolution:>10} {stage:<20}", stats, previous.get(resolution, {}).get(stage))
+        for resolution, stages in results["results"].items()
+        for stage, stats in stages.items()
+    ), "p50_ms", threshold)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AR pipeline stages on CPU.")
+    parser.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--video", help="Recorded frame sequence to use instead of synthetic frames")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="Previous JSON results to compare p50 latencies against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p50 slowdown before failing")
+    parser.add_argument("--threads", type=int, default=1, help="OpenCV worker threads (0 lets OpenCV decide)")
+    args = parser.parse_args(argv)
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+    results = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "mediapipe": getattr(mp, "__version__", "unknown"),
+            "numpy": np.__version__,
+            "frames": args.frames,
+            "warmup": args.warmup,
+            "opencv_threads": args.threads,
+            "source": args.video or "synthetic"
+        },
+        "results": {}
+    }
+    for resolution in args.resolutions:
+        width, height = parse_resolution(resolution)
+        print(f"Benchmarking {width}x{height}...", file=sys.stderr)
+        results["results"][f"{width}x{height}"] = run_resolution(width, height, args.frames, args.warmup, args.video)
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,14 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Cart
-from bson import ObjectId
 
 cart_bp = Blueprint('cart', __name__)
 
+MAX_BULK_ITEMS = 100
+
+def _cart_payload(user_id, cart):
+    return {"user_id": user_id, "items": cart.get('items', [])}
+
 @cart_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_cart():
@@ -25,19 +29,10 @@ def add_to_cart():
         quantity = data.get('quantity', 1)
         if not product_id:
             return jsonify({"error": "Product ID is required"}), 400
-        cart = Cart.get_user_cart(user_id)
-        items = cart.get('items', [])
-        existing_item = next((item for item in items if item['product_id'] == product_id), None)
-        if existing_item:
-            existing_item['quantity'] += quantity
-        else:
-            items.append({
-                'product_id': product_id,
-                'quantity': quantity,
-                'added_at': ObjectId().generation_time.isoformat()
-            })
-        Cart.update_cart(user_id, items)
-        return jsonify({"message": "Product added to cart", "cart": {"user_id": user_id, "items": items}}), 200
+        if not isinstance(quantity, int) or quantity <= 0:
+            return jsonify({"error": "Quantity must be a positive integer"}), 400
+        cart = Cart.add_item(user_id, product_id, quantity)
+        return jsonify({"message": "Product added to cart", "cart": _cart_payload(user_id, cart)}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -51,17 +46,33 @@ def update_cart_item():
         quantity = data.get('quantity')
         if not product_id or quantity is None:
             return jsonify({"error": "Product ID and quantity are required"}), 400
-        cart = Cart.get_user_cart(user_id)
-        items = cart.get('items', [])
-        if quantity <= 0:
-            items = [item for item in items if item['product_id'] != product_id]
-        else:
-            for item in items:
-                if item['product_id'] == product_id:
-                    item['quantity'] = quantity
-                    break
-        Cart.update_cart(user_id, items)
-        return jsonify({"message": "Cart updated", "cart": {"user_id": user_id, "items": items}}), 200
+        if not isinstance(quantity, int):
+            return jsonify({"error": "Quantity must be an integer"}), 400
+        cart = Cart.set_item_quantity(user_id, product_id, quantity)
+        return jsonify({"message": "Cart updated", "cart": _cart_payload(user_id, cart)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@cart_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_update_cart():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        items = data.get('items')
+        replace = bool(data.get('replace', False))
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Items are required"}), 400
+        if len(items) > MAX_BULK_ITEMS:
+            return jsonify({"error": f"At most {MAX_BULK_ITEMS} items per request"}), 400
+        for item in items:
+            if not isinstance(item, dict) or not item.get('product_id'):
+                return jsonify({"error": "Every item needs a product ID"}), 400
+            quantity = item.get('quantity')
+            if not isinstance(quantity, int) or (not replace and quantity <= 0):
+                return jsonify({"error": "Every item needs a valid quantity"}), 400
+        cart = Cart.bulk_update(user_id, items, replace)
+        return jsonify({"message": "Cart updated", "cart": _cart_payload(user_id, cart)}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -70,11 +81,8 @@ def update_cart_item():
 def remove_from_cart(product_id):
     try:
         user_id = get_jwt_identity()
-        cart = Cart.get_user_cart(user_id)
-        items = cart.get('items', [])
-        items = [item for item in items if item['product_id'] != product_id]
-        Cart.update_cart(user_id, items)
-        return jsonify({"message": "Product removed from cart", "cart": {"user_id": user_id, "items": items}}), 200
+        cart = Cart.remove_item(user_id, product_id)
+        return jsonify({"message": "Product removed from cart", "cart": _cart_payload(user_id, cart)}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
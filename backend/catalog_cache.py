@@ -0,0 +1,114 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app, request
+
+CatalogEntry = namedtuple('CatalogEntry', ['body', 'mimetype', 'etag', 'created_at'])
+
+class CatalogCache:
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('CATALOG_CACHE_TTL', 60))
+        self.max_entries = max_entries or int(os.getenv('CATALOG_CACHE_SIZE', 512))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._watcher = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.created_at > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get_or_build(self, key, build):
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        version = self._version
+        serialized = build()
+        if serialized is None:
+            return None
+        body, mimetype = serialized
+        entry = CatalogEntry(body, mimetype, hashlib.sha1(body).hexdigest(), time.monotonic())
+        with self._lock:
+            # Don't store a body built from data that was invalidated while we were reading it.
+            if version == self._version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, product_id=None):
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            if product_id is None:
+                self._entries.clear()
+                return
+            # Listings and searches may contain any product, so only other single-product entries survive.
+            # Keys end with the response format, so every format of this product is dropped.
+            product_key = ('product', str(product_id))
+            for key in list(self._entries):
+                if key[0] != 'product' or key[:2] == product_key:
+                    del self._entries[key]
+
+    def watch(self, collection, retry_delay=5.0, on_change=None):
+        if self._watcher is not None:
+            return self._watcher
+        def run():
+            while True:
+                try:
+                    with collection.watch() as stream:
+                        # Changes may have been missed while the stream was down.
+                        self.invalidate()
+                        if on_change:
+                            on_change(None)
+                        for change in stream:
+                            self.invalidate(change.get('documentKey', {}).get('_id'))
+                            if on_change:
+                                on_change(change)
+                except Exception as e:
+                    print(f"❌ Catalog change stream error: {e}")
+                time.sleep(retry_delay)
+        self._watcher = threading.Thread(target=run, name='catalog-change-stream', daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations
+            }
+
+catalog_cache = CatalogCache()
+
+def cached_json_response(key, build):
+    response_format = current_app.json.response_format()
+    entry = catalog_cache.get_or_build(key + (response_format,), lambda: _serialize(build(), response_format))
+    if entry is None:
+        return None
+    response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+    response.vary.add('Accept')
+    response.set_etag(entry.etag)
+    return response.make_conditional(request)
+
+def _serialize(payload, response_format):
+    if payload is None:
+        return None
+    return current_app.json.serialize(payload, response_format)
@@ -1,12 +1,6 @@
-import os
-import sys
-from pymongo import MongoClient
 from datetime import datetime
 from bson import ObjectId
-
-MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
-client = MongoClient(MONGODB_URI)
-db = client.get_database()
+from mongo import db
 
 def insert_sample_data():
     print("🚀 Inserting sample data into MongoDB...")
@@ -0,0 +1,71 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class BSONJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, indent=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def dumps_bytes(self, obj, indent=False):
+        # Mongo datetimes are naive UTC, so they are emitted with an explicit +00:00 offset.
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response_format(self):
+        if msgpack is None or not has_request_context():
+            return 'json'
+        if request.args.get('format') == 'msgpack':
+            return 'msgpack'
+        if request.accept_mimetypes.best_match([JSON_MIMETYPE, MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE:
+            return 'msgpack'
+        return 'json'
+
+    def serialize(self, obj, response_format=None):
+        if (response_format or self.response_format()) == 'msgpack':
+            return msgpack.packb(obj, default=_default, use_bin_type=True), MSGPACK_MIMETYPE
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self.dumps_bytes(obj, indent) + b'\n', self.mimetype
+
+    def response(self, *args, **kwargs):
+        body, mimetype = self.serialize(self._prepare_response_obj(args, kwargs))
+        response = self._app.response_class(body, mimetype=mimetype)
+        response.vary.add('Accept')
+        return response
@@ -0,0 +1,275 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from perf_stats import latency_stats, find_regressions
+
+DEFAULT_URI = 'mongomock://localhost/artify_loadtest'
+DEFAULT_MIX = "browse=35,product=20,search=20,add_to_cart=15,checkout=5,login=5"
+SKU_PREFIX = 'LT-'
+EMAIL_DOMAIN = '@loadtest.artify'
+PASSWORD = 'loadtest-password'
+
+CATEGORIES = ["glasses", "sunglasses", "hats", "earrings"]
+BRANDS = ["Ray-Ban", "Oakley", "Persol", "Warby Parker", "Gucci", "Prada"]
+STYLES = ["aviator", "wayfarer", "round", "cat-eye", "square", "oversized"]
+COLORS = ["black", "gold", "silver", "tortoise", "blue", "red", "clear"]
+ADJECTIVES = ["Classic", "Modern", "Vintage", "Sport", "Slim", "Bold"]
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, weight = part.split('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+    return mix
+
+def seed_catalog(db, size, users, seed=0):
+    # Only documents created by the load test are touched, so a real database keeps its own data.
+    from catalog_cache import catalog_cache
+    from models import User, product_search
+    rng = random.Random(seed)
+    emails = [f"user{i}{EMAIL_DOMAIN}" for i in range(users)]
+    old_users = [str(user['_id']) for user in db.users.find({"email": {"$regex": EMAIL_DOMAIN.replace('.', r'\.') + '$'}}, {"_id": 1})]
+    db.orders.delete_many({"user_id": {"$in": old_users}})
+    db.carts.delete_many({"user_id": {"$in": old_users}})
+    db.users.delete_many({"email": {"$in": emails}})
+    db.products.delete_many({"sku": {"$regex": f"^{SKU_PREFIX}"}})
+    products = []
+    for i in range(size):
+        style = rng.choice(STYLES)
+        brand = rng.choice(BRANDS)
+        category = rng.choice(CATEGORIES)
+        products.append({
+            "sku": f"{SKU_PREFIX}{i:06d}",
+            "name": f"{rng.choice(ADJECTIVES)} {style.title()} {category.title()} {i}",
+            "category": category,
+            "price": round(rng.uniform(19, 399), 2),
+            "description": f"{brand} {style} {category} with {rng.choice(['UV400 lenses', 'a lightweight frame', 'spring hinges'])}",
+            "brand": brand,
+            "colors": rng.sample(COLORS, rng.randint(1, 3)),
+            "style": style,
+            "features": rng.sample(["Polarized", "UV Protection", "Lightweight", "Scratch Resistant"], 2),
+            "in_stock": True,
+            "stock_quantity": 10 ** 9,
+            "created_at": datetime.utcnow()
+        })
+    for start in range(0, len(products), 1000):
+        db.products.insert_many(products[start:start + 1000])
+    for email in emails:
+        User.create_user(email, PASSWORD, email.split('@')[0])
+    catalog_cache.invalidate()
+    product_search.mark_stale()
+    product_ids = [str(doc['_id']) for doc in db.products.find({"sku": {"$regex": f"^{SKU_PREFIX}"}}, {"_id": 1})]
+    terms = sorted({word.lower() for product in products for word in product["name"].split() if not word.isdigit()})
+    return product_ids, emails, terms
+
+class VirtualUser:
+    def __init__(self, app, index, email, catalog, rng):
+        self.client = app.test_client()
+        self.email = email
+        self.catalog = catalog
+        self.rng = rng
+        # A distinct address per user, as real clients would have; only failed logins count against it.
+        self.environ = {"REMOTE_ADDR": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"}
+        self.headers = {}
+        self.cart_size = 0
+        self.cursor = None
+
+    def request(self, method, path, **kwargs):
+        return self.client.open(path, method=method, headers=self.headers, environ_base=self.environ, **kwargs)
+
+def login(user):
+    response = user.request('POST', '/api/auth/login', json={"email": user.email, "password": PASSWORD})
+    if response.status_code == 200:
+        user.headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+    return response
+
+def browse(user):
+    path = '/api/products/?limit=24' + (f'&cursor={user.cursor}' if user.cursor else '')
+    response = user.request('GET', path)
+    next_cursor = (response.get_json(silent=True) or {}).get('next_cursor') if response.status_code == 200 else None
+    # Users page forward a few times, then start over from the top.
+    user.cursor = next_cursor if next_cursor and user.rng.random() < 0.7 else None
+    return response
+
+def product(user):
+    return user.request('GET', f"/api/products/{user.rng.choice(user.catalog['products'])}")
+
+def search(user):
+    query = ' '.join(user.rng.sample(user.catalog['terms'], user.rng.randint(1, 2)))
+    return user.request('GET', '/api/products/search', query_string={"q": query, "limit": 20})
+
+def add_to_cart(user):
+    response = user.request('POST', '/api/cart/add', json={
+        "product_id": user.rng.choice(user.catalog['products']),
+        "quantity": user.rng.randint(1, 2)
+    })
+    if response.status_code == 200:
+        user.cart_size += 1
+    return response
+
+def checkout(user):
+    if not user.cart_size:
+        return None
+    response = user.request('POST', '/api/orders/', json={
+        "shipping_address": {"street": "1 Load Test Way", "city": "Testville", "zip": "00000"},
+        "payment_method": "card"
+    })
+    if response.status_code == 201:
+        user.cart_size = 0
+    return response
+
+SCENARIOS = {
+    "browse": browse,
+    "product": product,
+    "search": search,
+    "add_to_cart": add_to_cart,
+    "checkout": checkout,
+    "login": login
+}
+
+def run_user(user, mix, deadline, requests_per_user, samples, lock):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    local = {}
+    completed = 0
+    while time.monotonic() < deadline and (not requests_per_user or completed < requests_per_user):
+        name = user.rng.choices(names, weights)[0]
+        if name == "checkout" and not user.cart_size:
+            name = "add_to_cart"
+        started = time.perf_counter()
+        response = SCENARIOS[name](user)
+        elapsed = time.perf_counter() - started
+        if response is None:
+            continue
+        durations, statuses = local.setdefault(name, ([], Counter()))
+        durations.append(elapsed)
+        statuses[response.status_code] += 1
+        completed += 1
+    with lock:
+        for name, (durations, statuses) in local.items():
+            merged = samples.setdefault(name, ([], Counter()))
+            merged[0].extend(durations)
+            merged[1].update(statuses)
+
+def summarize(durations, statuses, elapsed):
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        "requests": len(durations),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(len(durations) / elapsed, 2) if elapsed > 0 else None,
+        **latency_stats(durations)
+    }
+
+def compare(results, baseline, threshold):
+    previous = baseline.get("results", {})
+    return find_regressions((
+        (f"{endpoint:<12}", stats, previous.get(endpoint))
+        for endpoint, stats in results["results"].items()
+    ), "p95_ms", threshold)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive a weighted request mix against the API in-process.")
+    parser.add_argument("--uri", default=os.getenv('LOADTEST_MONGODB_URI', DEFAULT_URI),
+                        help="MongoDB URI; mongomock:// runs fully in memory")
+    parser.add_argument("--products", type=int, default=2000, help="Catalog size to seed")
+    parser.add_argument("--users", type=int, default=20, help="Virtual users (one thread each)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run after warmup")
+    parser.add_argument("--requests-per-user", type=int, default=0, help="Stop each user after this many requests")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of traffic discarded before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--bcrypt-rounds", type=int, help="Override BCRYPT_ROUNDS for the run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="Previous JSON results to compare p95 latencies against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p95 slowdown before failing")
+    args = parser.parse_args(argv)
+
+    # The app reads its configuration at import time, so the environment is set up first.
+    os.environ['MONGODB_URI'] = args.uri
+    if args.bcrypt_rounds:
+        os.environ['BCRYPT_ROUNDS'] = str(args.bcrypt_rounds)
+    # Startup messages from the app go to stderr so stdout stays valid JSON.
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import app, startup
+        startup()
+    from mongo import db
+
+    print(f"Seeding {args.products} products and {args.users} users...", file=sys.stderr)
+    product_ids, emails, terms = seed_catalog(db, args.products, args.users, args.seed)
+    catalog = {"products": product_ids, "terms": terms}
+    users = [VirtualUser(app, i, email, catalog, random.Random(args.seed + i)) for i, email in enumerate(emails)]
+    for user in users:
+        login(user)
+
+    lock = threading.Lock()
+    if args.warmup > 0:
+        print(f"Warming up for {args.warmup:.0f}s...", file=sys.stderr)
+        deadline = time.monotonic() + args.warmup
+        threads = [threading.Thread(target=run_user, args=(user, args.mix, deadline, 0, {}, lock)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    print(f"Running {len(users)} users for {args.duration:.0f}s...", file=sys.stderr)
+    samples = {}
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=run_user, args=(user, args.mix, deadline, args.requests_per_user, samples, lock))
+        for user in users
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    results = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mongodb": args.uri.split('://', 1)[0],
+            "products": args.products,
+            "users": args.users,
+            "duration_s": round(elapsed, 2),
+            "warmup_s": args.warmup,
+            "mix": args.mix,
+            "bcrypt_rounds": int(os.getenv('BCRYPT_ROUNDS', 0)) or None
+        },
+        "total": summarize(
+            [d for durations, _ in samples.values() for d in durations],
+            sum((statuses for _, statuses in samples.values()), Counter()),
+            elapsed
+        ) if samples else None,
+        "results": {name: summarize(durations, statuses, elapsed) for name, (durations, statuses) in sorted(samples.items())}
+    }
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} endpoint(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import argparse
+import sys
+from models import ensure_indexes, explain_queries
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create model indexes and check query plans.")
+    parser.add_argument("--explain", action="store_true", help="Run explain() on every model query and report collection scans")
+    parser.add_argument("--skip-create", action="store_true", help="Only report, don't create indexes")
+    args = parser.parse_args(argv)
+    if not args.skip_create:
+        print("🚀 Ensuring indexes...")
+        created, failed = ensure_indexes()
+        for collection, names in created.items():
+            print(f"  {collection}: {', '.join(names)}")
+        for collection, error in failed.items():
+            print(f"❌ {collection}: {error}")
+        if failed:
+            print(f"{len(failed)} collection(s) failed to build indexes")
+            return 1
+        print("✅ Indexes ensured.")
+    if not args.explain:
+        return 0
+    scans = 0
+    for entry in explain_queries():
+        marker = "❌" if entry["collection_scan"] else "✅"
+        print(f"{marker} {entry['collection']}.{entry['query']}: {' <- '.join(stage for stage in entry['stages'] if stage)}")
+        scans += entry["collection_scan"]
+    if scans:
+        print(f"{scans} quer{'y' if scans == 1 else 'ies'} fall back to a collection scan")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, request, current_app
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {count}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._gauges = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauges(self, prefix, stats):
+        # Exposes every numeric field of an existing stats() dict as <prefix>_<field>.
+        with self._lock:
+            self._gauges.append((prefix, stats))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            gauges = list(self._gauges)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for prefix, stats in gauges:
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for field, value in values.items():
+                if isinstance(value, (bool, int, float)):
+                    lines.append(f"# TYPE {prefix}_{field} gauge")
+                    lines.append(f"{prefix}_{field} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter('http_requests_total', 'HTTP requests by route and status.', ('method', 'route', 'status'))
+http_errors = registry.counter('http_request_errors_total', 'HTTP requests that ended in a 5xx response.', ('method', 'route', 'status'))
+http_latency = registry.histogram('http_request_duration_seconds', 'HTTP request latency.', ('method', 'route'))
+mongo_commands = registry.counter('mongo_commands_total', 'MongoDB commands by name and outcome.', ('command', 'outcome'))
+mongo_latency = registry.histogram('mongo_command_duration_seconds', 'MongoDB command latency.', ('command',),
+                                   buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+ar_stage_latency = registry.histogram('ar_stage_duration_seconds', 'AR pipeline stage latency.', ('stage', 'path'))
+
+# Sync PyMongo publishes command events on the calling thread, so they can be attributed to the current request.
+_request_state = threading.local()
+
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, 'success')
+
+    def failed(self, event):
+        self._record(event, 'failure')
+
+    def _record(self, event, outcome):
+        seconds = event.duration_micros / 1e6
+        mongo_commands.inc(command=event.command_name, outcome=outcome)
+        mongo_latency.observe(seconds, command=event.command_name)
+        state = getattr(_request_state, 'mongo', None)
+        if state is not None:
+            state[0] += 1
+            state[1] += seconds
+
+command_metrics = CommandMetrics()
+
+def record_ar_timings(timings, path):
+    for stage, seconds in timings.items():
+        ar_stage_latency.observe(seconds, stage=stage, path=path)
+
+def _before_request():
+    _request_state.started = time.perf_counter()
+    _request_state.mongo = [0, 0.0]
+
+def _after_request(response):
+    started = getattr(_request_state, 'started', None)
+    mongo = getattr(_request_state, 'mongo', None) or [0, 0.0]
+    _request_state.started = None
+    _request_state.mongo = None
+    # WebSocket sessions would record their whole lifetime as one request.
+    if started is None or request.environ.get('HTTP_UPGRADE', '').lower() == 'websocket':
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else '<unmatched>'
+    status = str(response.status_code)
+    http_requests.inc(method=request.method, route=route, status=status)
+    http_latency.observe(elapsed, method=request.method, route=route)
+    if response.status_code >= 500:
+        http_errors.inc(method=request.method, route=route, status=status)
+    slow_ms = current_app.config.get('SLOW_REQUEST_MS')
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        current_app.logger.warning(
+            "Slow request %s %s -> %s in %.1f ms (%d mongo commands, %.1f ms)",
+            request.method, request.full_path.rstrip('?'), status, elapsed * 1000, mongo[0], mongo[1] * 1000
+        )
+    return response
+
+def metrics_endpoint():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+def init_app(app):
+    app.config.setdefault('SLOW_REQUEST_MS', float(os.getenv('SLOW_REQUEST_MS', 0)))
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
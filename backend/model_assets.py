@@ -0,0 +1,494 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import struct
+import sys
+import threading
+import numpy as np
+from PIL import Image
+
+GLB_MAGIC = b'glTF'
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+COMPONENT_DTYPES = {5120: '<i1', 5121: '<u1', 5122: '<i2', 5123: '<u2', 5125: '<u4', 5126: '<f4'}
+TYPE_SIZES = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT2': 4, 'MAT3': 9, 'MAT4': 16}
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+# Extensions whose data this pipeline cannot decode or would silently drop.
+UNSUPPORTED_EXTENSIONS = {'KHR_draco_mesh_compression', 'EXT_meshopt_compression', 'EXT_mesh_gpu_instancing'}
+
+PIPELINE_VERSION = 1
+# (name, clustering grid resolution per primitive (0 keeps every vertex), max texture side)
+LOD_LEVELS = (("high", 0, 2048), ("medium", 96, 512), ("low", 32, 256))
+UV_GRID = 64
+ANCHOR_GRID = 6
+MAX_ANCHOR_POINTS = 64
+PRODUCT_ASSET_PREFIX = 'product:'
+# Where each category's bounding box sits in HeadPoseEstimator.face_3d_model space (y up, +z towards the
+# camera, nose tip at the origin, outer eye corners at x = +-225, y = 170). glTF assets are +y up and face +z,
+# so a uniform scale plus a translation is enough: "fit" scales the box along one axis to the given size and
+# "align" ("min", "center" or "max" per axis) picks the box point that lands on "at".
+CATEGORY_PLACEMENTS = {
+    "glasses": {"fit": (0, 560.0), "align": ("center", "center", "max"), "at": (0.0, 170.0, -40.0)},
+    "sunglasses": {"fit": (0, 560.0), "align": ("center", "center", "max"), "at": (0.0, 170.0, -40.0)},
+    "hats": {"fit": (0, 700.0), "align": ("center", "min", "center"), "at": (0.0, 330.0, -300.0)},
+    "earrings": {"fit": (1, 120.0), "align": ("center", "max", "center"), "at": (-310.0, -60.0, -420.0)}
+}
+DEFAULT_PLACEMENT = CATEGORY_PLACEMENTS["glasses"]
+FILENAME_PATTERN = re.compile(r'^[\w-]+\.[a-z]+\.[0-9a-f]{16}\.glb$')
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def read_glb(data):
+    if len(data) < 20:
+        raise ValueError("File is too small to be a GLB")
+    magic, version, length = struct.unpack_from('<4sII', data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise ValueError("Not a glTF 2.0 binary")
+    gltf = None
+    binary = b''
+    offset = 12
+    while offset + 8 <= min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == CHUNK_BIN and not binary:
+            binary = bytes(chunk)
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise ValueError("GLB has no JSON chunk")
+    unsupported = UNSUPPORTED_EXTENSIONS & set(gltf.get('extensionsUsed', []))
+    if unsupported:
+        raise ValueError(f"Unsupported glTF extensions: {', '.join(sorted(unsupported))}")
+    return gltf, binary
+
+def write_glb(gltf, binary):
+    payload = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    payload += b' ' * (-len(payload) % 4)
+    binary += b'\0' * (-len(binary) % 4)
+    chunks = struct.pack('<II', len(payload), CHUNK_JSON) + payload
+    if binary:
+        chunks += struct.pack('<II', len(binary), CHUNK_BIN) + binary
+    return struct.pack('<4sII', GLB_MAGIC, 2, 12 + len(chunks)) + chunks
+
+def _view_bytes(gltf, binary, index):
+    view = gltf['bufferViews'][index]
+    if view.get('buffer', 0) != 0:
+        raise ValueError("External buffers are not supported")
+    start = view.get('byteOffset', 0)
+    return binary[start:start + view['byteLength']]
+
+def read_accessor(gltf, binary, index):
+    accessor = gltf['accessors'][index]
+    if 'sparse' in accessor:
+        raise ValueError("Sparse accessors are not supported")
+    dtype = np.dtype(COMPONENT_DTYPES[accessor['componentType']])
+    width = TYPE_SIZES[accessor['type']]
+    count = accessor['count']
+    if 'bufferView' not in accessor:
+        return np.zeros((count, width), dtype)
+    view = gltf['bufferViews'][accessor['bufferView']]
+    data = _view_bytes(gltf, binary, accessor['bufferView'])
+    element = dtype.itemsize * width
+    stride = view.get('byteStride') or element
+    start = accessor.get('byteOffset', 0)
+    raw = np.frombuffer(data, dtype=np.uint8, count=stride * (count - 1) + element if count else 0, offset=start)
+    rows = np.lib.stride_tricks.as_strided(raw, shape=(count, element), strides=(stride, 1))
+    return np.ascontiguousarray(rows).view(dtype).reshape(count, width)
+
+class _BufferBuilder:
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+        self.views = []
+        self.accessors = []
+
+    def add_view(self, data, target=None):
+        padding = -self.length % 4
+        if padding:
+            self.parts.append(b'\0' * padding)
+            self.length += padding
+        view = {"buffer": 0, "byteOffset": self.length, "byteLength": len(data)}
+        if target:
+            view["target"] = target
+        self.parts.append(data)
+        self.length += len(data)
+        self.views.append(view)
+        return len(self.views) - 1
+
+    def add_accessor(self, array, template, target=None, bounds=False):
+        accessor = {key: value for key, value in template.items()
+                    if key not in ('bufferView', 'byteOffset', 'count', 'min', 'max', 'sparse')}
+        array = np.ascontiguousarray(array, dtype=COMPONENT_DTYPES[accessor['componentType']])
+        accessor["bufferView"] = self.add_view(array.tobytes(), target)
+        accessor["count"] = len(array)
+        if (bounds or 'min' in template) and len(array):
+            accessor["min"] = array.min(axis=0).tolist()
+            accessor["max"] = array.max(axis=0).tolist()
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def add_indices(self, indices):
+        indices = np.asarray(indices).reshape(-1)
+        # 65535 is reserved as the primitive restart value for unsigned shorts.
+        component = UNSIGNED_SHORT if not len(indices) or indices.max() < 65535 else UNSIGNED_INT
+        return self.add_accessor(indices, {"componentType": component, "type": "SCALAR"}, ELEMENT_ARRAY_BUFFER)
+
+    def data(self):
+        return b''.join(self.parts)
+
+def cluster_vertices(positions, indices, resolution, uvs=None):
+    # Vertex clustering: vertices sharing a grid cell (and, when textured, a UV cell so seams survive)
+    # collapse onto the first of them; triangles that become degenerate or duplicated are dropped.
+    lo = positions.min(axis=0)
+    extent = max(float((positions.max(axis=0) - lo).max()), 1e-12)
+    cells = np.minimum(np.floor((positions - lo) / extent * resolution), resolution - 1).astype(np.int64)
+    if uvs is not None:
+        cells = np.hstack([cells, np.floor(uvs[:, :2].astype(np.float64) * UV_GRID).astype(np.int64)])
+    _, first, inverse = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+    representative = first[inverse.reshape(-1)]
+    triangles = representative[indices[:len(indices) - len(indices) % 3].reshape(-1, 3)]
+    triangles = triangles[(triangles[:, 0] != triangles[:, 1]) &
+                          (triangles[:, 1] != triangles[:, 2]) &
+                          (triangles[:, 0] != triangles[:, 2])]
+    if len(triangles):
+        _, unique_rows = np.unique(np.sort(triangles, axis=1), axis=0, return_index=True)
+        triangles = triangles[np.sort(unique_rows)]
+    keep = np.unique(triangles)
+    remap = np.zeros(len(positions), dtype=np.int64)
+    remap[keep] = np.arange(len(keep))
+    return keep, remap[triangles].reshape(-1)
+
+def _downscale_image(data, max_size):
+    with Image.open(io.BytesIO(data)) as image:
+        if max(image.size) <= max_size:
+            return data
+        image_format = image.format
+        scale = max_size / max(image.size)
+        resized = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    out = io.BytesIO()
+    if image_format == 'JPEG':
+        resized.convert('L' if resized.mode == 'L' else 'RGB').save(out, 'JPEG', quality=85, optimize=True)
+    else:
+        resized.save(out, 'PNG', optimize=True)
+    return out.getvalue() if out.tell() < len(data) else data
+
+def _rebuild_primitive(primitive, gltf, binary, builder, resolution):
+    attributes = primitive['attributes']
+    targets = primitive.get('targets', [])
+    keep = None
+    triangles = None
+    if resolution > 0 and primitive.get('mode', TRIANGLES) == TRIANGLES and 'POSITION' in attributes:
+        positions = read_accessor(gltf, binary, attributes['POSITION']).astype(np.float64)
+        if 'indices' in primitive:
+            indices = read_accessor(gltf, binary, primitive['indices']).reshape(-1).astype(np.int64)
+        else:
+            indices = np.arange(len(positions), dtype=np.int64)
+        uvs = read_accessor(gltf, binary, attributes['TEXCOORD_0']) if 'TEXCOORD_0' in attributes else None
+        keep, triangles = cluster_vertices(positions, indices, resolution, uvs)
+        if not len(triangles):
+            # Tiny parts can collapse entirely; keep them as they are rather than emit an empty primitive.
+            keep, triangles = None, None
+    def rebuild(accessors):
+        return {
+            name: builder.add_accessor(
+                read_accessor(gltf, binary, index) if keep is None else read_accessor(gltf, binary, index)[keep],
+                gltf['accessors'][index], ARRAY_BUFFER, bounds=name == 'POSITION'
+            )
+            for name, index in accessors.items()
+        }
+    vertex_count = gltf['accessors'][attributes['POSITION']]['count'] if 'POSITION' in attributes else 0
+    if keep is not None:
+        vertex_count = len(keep)
+        primitive['indices'] = builder.add_indices(triangles)
+    elif 'indices' in primitive:
+        triangles = read_accessor(gltf, binary, primitive['indices'])
+        primitive['indices'] = builder.add_indices(triangles)
+    primitive['attributes'] = rebuild(attributes)
+    if targets:
+        primitive['targets'] = [rebuild(target) for target in targets]
+    if primitive.get('mode', TRIANGLES) != TRIANGLES:
+        return vertex_count, 0
+    return vertex_count, (len(triangles) if triangles is not None else vertex_count) // 3
+
+def build_variant(gltf, binary, resolution=0, max_texture_size=None):
+    out = json.loads(json.dumps(gltf))
+    builder = _BufferBuilder()
+    copied = {}
+    def copy_accessor(index):
+        if index not in copied:
+            copied[index] = builder.add_accessor(read_accessor(gltf, binary, index), gltf['accessors'][index])
+        return copied[index]
+    vertices = triangles = 0
+    for mesh in out.get('meshes', []):
+        for primitive in mesh['primitives']:
+            primitive_vertices, primitive_triangles = _rebuild_primitive(primitive, gltf, binary, builder, resolution)
+            vertices += primitive_vertices
+            triangles += primitive_triangles
+    for skin in out.get('skins', []):
+        if 'inverseBindMatrices' in skin:
+            skin['inverseBindMatrices'] = copy_accessor(skin['inverseBindMatrices'])
+    for animation in out.get('animations', []):
+        for sampler in animation.get('samplers', []):
+            sampler['input'] = copy_accessor(sampler['input'])
+            sampler['output'] = copy_accessor(sampler['output'])
+    for image in out.get('images', []):
+        if 'bufferView' in image:
+            data = _view_bytes(gltf, binary, image['bufferView'])
+            if max_texture_size:
+                data = _downscale_image(data, max_texture_size)
+            image['bufferView'] = builder.add_view(data)
+    out['bufferViews'] = builder.views
+    out['accessors'] = builder.accessors
+    if builder.length:
+        out['buffers'] = [{"byteLength": builder.length + (-builder.length % 4)}]
+    else:
+        out.pop('buffers', None)
+    return write_glb(out, builder.data()), {"vertices": vertices, "triangles": triangles}
+
+def _local_matrix(node):
+    if 'matrix' in node:
+        return np.asarray(node['matrix'], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get('rotation', (0.0, 0.0, 0.0, 1.0))
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]
+    ])
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation * np.asarray(node.get('scale', (1.0, 1.0, 1.0)), dtype=np.float64)
+    matrix[:3, 3] = node.get('translation', (0.0, 0.0, 0.0))
+    return matrix
+
+def _mesh_instances(gltf):
+    nodes = gltf.get('nodes', [])
+    scenes = gltf.get('scenes', [])
+    if scenes:
+        roots = scenes[gltf.get('scene', 0)].get('nodes', [])
+    else:
+        children = {child for node in nodes for child in node.get('children', [])}
+        roots = [i for i in range(len(nodes)) if i not in children]
+    stack = [(index, np.eye(4)) for index in roots]
+    while stack:
+        index, parent = stack.pop()
+        node = nodes[index]
+        world = parent @ _local_matrix(node)
+        if 'mesh' in node:
+            yield gltf['meshes'][node['mesh']], world
+        stack.extend((child, world) for child in node.get('children', []))
+
+def extract_anchors(gltf, binary, max_points=MAX_ANCHOR_POINTS):
+    # Anchors are in model space (scene root units); fit_anchors moves them into the head-model frame.
+    points = []
+    for mesh, world in _mesh_instances(gltf):
+        for primitive in mesh['primitives']:
+            if 'POSITION' in primitive['attributes']:
+                positions = read_accessor(gltf, binary, primitive['attributes']['POSITION']).astype(np.float64)
+                points.append(positions @ world[:3, :3].T + world[:3, 3])
+    if not points:
+        return None
+    points = np.concatenate(points)
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    extent = max(float((hi - lo).max()), 1e-12)
+    cells = np.minimum(np.floor((points - lo) / extent * ANCHOR_GRID), ANCHOR_GRID - 1).astype(np.int64)
+    _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    centroids = np.stack([np.bincount(inverse, weights=points[:, axis]) for axis in range(3)], axis=1) / counts[:, None]
+    if len(centroids) > max_points:
+        centroids = centroids[np.linspace(0, len(centroids) - 1, max_points).astype(np.intp)]
+    named = {}
+    for axis, (low_name, high_name) in enumerate((("left", "right"), ("bottom", "top"), ("back", "front"))):
+        named[low_name] = points[np.argmin(points[:, axis])]
+        named[high_name] = points[np.argmax(points[:, axis])]
+    def rounded(values):
+        return np.round(values, 6).tolist()
+    return {
+        "center": rounded((lo + hi) / 2),
+        "min": rounded(lo),
+        "max": rounded(hi),
+        "named": {name: rounded(point) for name, point in named.items()},
+        "points": rounded(centroids)
+    }
+
+def _write_atomic(path, data):
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+class ModelAssetStore:
+    def __init__(self, source_dir=None, cache_dir=None, lods=LOD_LEVELS):
+        self.source_dir = source_dir or os.getenv(
+            'MODEL_SOURCE_DIR', os.path.join(_BACKEND_DIR, '..', 'frontend', 'public', 'models'))
+        self.cache_dir = cache_dir or os.getenv('MODEL_CACHE_DIR', os.path.join(_BACKEND_DIR, 'model_cache'))
+        self.lods = tuple(lods)
+        self._manifests = {}
+        self._build_locks = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def source_path(self, model_path):
+        # Only the file name of model_path is used, so it can never point outside source_dir.
+        name = os.path.basename(model_path or '')
+        if not name.lower().endswith('.glb'):
+            return None
+        path = os.path.join(self.source_dir, name)
+        return path if os.path.isfile(path) else None
+
+    def file_path(self, filename):
+        if not FILENAME_PATTERN.match(filename):
+            return None
+        path = os.path.join(self.cache_dir, filename)
+        return path if os.path.isfile(path) else None
+
+    def manifest(self, model_path):
+        path = self.source_path(model_path)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._manifests.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+            build_lock = self._build_locks.setdefault(path, threading.Lock())
+        with build_lock:
+            with self._lock:
+                cached = self._manifests.get(path)
+                if cached and cached[0] == signature:
+                    return cached[1]
+            manifest = self._load_or_build(path)
+            with self._lock:
+                self._manifests[path] = (signature, manifest)
+            return manifest
+
+    def invalidate(self, model_path=None):
+        with self._lock:
+            if model_path is None:
+                self._manifests.clear()
+            else:
+                self._manifests.pop(self.source_path(model_path), None)
+
+    def stats(self):
+        with self._lock:
+            return {"manifests": len(self._manifests), "builds": self.builds}
+
+    def _load_or_build(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        # Source bytes and pipeline settings together decide whether cached variants are still valid.
+        settings = json.dumps([PIPELINE_VERSION, self.lods]).encode('utf-8')
+        source_hash = hashlib.sha256(data + settings).hexdigest()[:16]
+        stem = re.sub(r'[^\w-]', '_', os.path.splitext(os.path.basename(path))[0])
+        manifest_path = os.path.join(self.cache_dir, f"{stem}.{source_hash}.json")
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if all(self.file_path(lod["file"]) for lod in manifest["lods"].values()):
+                return manifest
+        os.makedirs(self.cache_dir, exist_ok=True)
+        gltf, binary = read_glb(data)
+        lods = {}
+        for name, resolution, max_texture_size in self.lods:
+            variant, counts = build_variant(gltf, binary, resolution, max_texture_size)
+            filename = f"{stem}.{name}.{hashlib.sha256(variant).hexdigest()[:16]}.glb"
+            _write_atomic(os.path.join(self.cache_dir, filename), variant)
+            lods[name] = {"file": filename, "bytes": len(variant), **counts}
+        manifest = {
+            "source": os.path.basename(path),
+            "source_bytes": len(data),
+            "source_hash": source_hash,
+            "version": PIPELINE_VERSION,
+            "lods": lods,
+            "anchors": extract_anchors(gltf, binary)
+        }
+        _write_atomic(manifest_path, json.dumps(manifest).encode('utf-8'))
+        with self._lock:
+            self.builds += 1
+        return manifest
+
+model_assets = ModelAssetStore()
+
+def anchor_transform(anchors, category=None, override=None):
+    # A product can pin its own {"scale", "translation"}; otherwise the category placement is fitted to the box.
+    if override and 'scale' in override and 'translation' in override:
+        return float(override['scale']), np.asarray(override['translation'], dtype=np.float64)
+    placement = CATEGORY_PLACEMENTS.get((category or '').lower(), DEFAULT_PLACEMENT)
+    lo = np.asarray(anchors['min'], dtype=np.float64)
+    hi = np.asarray(anchors['max'], dtype=np.float64)
+    axis, size = placement["fit"]
+    scale = size / max(float(hi[axis] - lo[axis]), 1e-9)
+    reference = np.array([{"min": lo[i], "center": (lo[i] + hi[i]) / 2, "max": hi[i]}[align]
+                          for i, align in enumerate(placement["align"])])
+    return scale, np.asarray(placement["at"], dtype=np.float64) - reference * scale
+
+def fit_anchors(anchors, category=None, override=None):
+    scale, translation = anchor_transform(anchors, category, override)
+    def place(values):
+        return np.round(np.asarray(values, dtype=np.float64) * scale + translation, 3).tolist()
+    return {
+        "frame": "head_model",
+        "transform": {"scale": round(scale, 6), "translation": np.round(translation, 3).tolist()},
+        "center": place(anchors['center']),
+        "min": place(anchors['min']),
+        "max": place(anchors['max']),
+        "named": {name: place(point) for name, point in anchors['named'].items()},
+        "points": place(anchors['points'])
+    }
+
+def product_anchors(product):
+    manifest = model_assets.manifest(product.get('model_path'))
+    if not manifest or not manifest.get('anchors'):
+        return None
+    return fit_anchors(manifest['anchors'], product.get('category'), product.get('anchor_transform'))
+
+def product_anchor_points(product_id):
+    from bson import ObjectId
+    from bson.errors import InvalidId
+    from models import Product
+    try:
+        product = Product.get_product_by_id(ObjectId(product_id))
+    except InvalidId:
+        return None
+    anchors = product_anchors(product) if product else None
+    if anchors is None:
+        return None
+    return np.asarray(anchors['points'], dtype=np.float64)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute LOD variants and anchors for product 3D models.")
+    parser.add_argument("paths", nargs="*", help="GLB files to process instead of every product's model_path")
+    args = parser.parse_args(argv)
+    if args.paths:
+        targets = [(os.path.basename(path), path, ModelAssetStore(source_dir=os.path.dirname(os.path.abspath(path))))
+                   for path in args.paths]
+    else:
+        from mongo import db
+        targets = [(product.get('name', str(product['_id'])), product['model_path'], model_assets)
+                   for product in db.products.find({"model_path": {"$exists": True}}, {"name": 1, "model_path": 1})]
+    print(f"🚀 Building model assets into {model_assets.cache_dir}...")
+    failures = 0
+    for label, model_path, store in targets:
+        try:
+            manifest = store.manifest(model_path)
+        except (ValueError, OSError) as e:
+            manifest, error = None, str(e)
+        else:
+            error = "model file not found"
+        if manifest is None:
+            failures += 1
+            print(f"❌ {label}: {error}")
+            continue
+        sizes = ', '.join(f"{name} {lod['bytes'] / 1024:.0f} KiB ({lod['triangles']} tris)" for name, lod in manifest['lods'].items())
+        print(f"✅ {label}: {manifest['source_bytes'] / 1024:.0f} KiB -> {sizes}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
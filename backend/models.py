@@ -1,17 +1,49 @@
-from pymongo import MongoClient
-from datetime import datetime
-import os
-import bcrypt
+from pymongo import IndexModel, ReturnDocument, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import ConfigurationError, DuplicateKeyError, OperationFailure
+from bson import ObjectId
+from bson.errors import InvalidId
+from collections import Counter
+from datetime import datetime, timedelta
+from mongo import db, get_client, is_mock
+from password_hashing import password_hasher
+from catalog_cache import catalog_cache
+from search_index import ProductSearchIndex
 
-client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
-db = client.get_database()
+product_search = ProductSearchIndex(lambda: db.products.find({}, ProductSearchIndex.PROJECTION))
+
+def sync_product_search(change=None):
+    # Called with None when changes may have been missed, otherwise with one change stream event.
+    if change is None or change.get('operationType') not in ('insert', 'update', 'replace', 'delete'):
+        product_search.mark_stale()
+        return
+    doc_id = change['documentKey']['_id']
+    if change['operationType'] == 'update':
+        updated = change.get('updateDescription', {})
+        fields = set(updated.get('updatedFields', {})) | set(updated.get('removedFields', []))
+        # Stock decrements from checkout don't touch anything the index reads.
+        if not any(field.split('.')[0] in ProductSearchIndex.PROJECTION for field in fields):
+            return
+    product = None if change['operationType'] == 'delete' else db.products.find_one({"_id": doc_id}, ProductSearchIndex.PROJECTION)
+    if product:
+        product_search.upsert(product)
+    else:
+        product_search.remove(doc_id)
 
 class User:
+    COLLECTION = 'users'
+    INDEXES = [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True)
+    ]
+    QUERY_PLANS = [
+        ("verify_user", {"email": "user@example.com"}, None),
+        ("get_user_by_id", {"_id": ObjectId()}, None)
+    ]
+
     @staticmethod
     def create_user(email, password, name):
         if db.users.find_one({"email": email}):
             return None, "User already exists"
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = password_hasher.hash(password)
         user = {
             "email": email,
             "password": hashed_password,
@@ -19,13 +51,20 @@ class User:
             "created_at": datetime.utcnow(),
             "role": "user"
         }
-        result = db.users.insert_one(user)
+        try:
+            result = db.users.insert_one(user)
+        except DuplicateKeyError:
+            return None, "User already exists"
         return str(result.inserted_id), None
 
     @staticmethod
     def verify_user(email, password):
         user = db.users.find_one({"email": email})
-        if user and bcrypt.checkpw(password.encode('utf-8'), user['password']):
+        if user and password_hasher.verify(password, user['password']):
+            # Upgrade hashes created under an older cost factor while the plaintext is at hand.
+            if password_hasher.needs_rehash(user['password']):
+                db.users.update_one({"_id": user['_id']}, {"$set": {"password": password_hasher.hash(password)}})
+                password_hasher.record_rehash()
             return user, None
         return None, "Invalid credentials"
 
@@ -34,47 +73,92 @@ class User:
         return db.users.find_one({"_id": user_id})
 
 class Product:
-    @staticmethod
-    def get_all_products():
-        return list(db.products.find({}))
+    COLLECTION = 'products'
+    INDEXES = [
+        IndexModel([("category", ASCENDING)], name="category"),
+        IndexModel([("brand", ASCENDING)], name="brand"),
+        IndexModel([("colors", ASCENDING)], name="colors"),
+        IndexModel([("style", ASCENDING)], name="style"),
+        IndexModel([("sku", ASCENDING)], name="sku", unique=True,
+                   partialFilterExpression={"sku": {"$exists": True}})
+    ]
+    QUERY_PLANS = [
+        ("find_products", {}, [("_id", ASCENDING)]),
+        ("find_products_after", {"_id": {"$gt": ObjectId()}}, [("_id", ASCENDING)]),
+        ("get_products_by_ids", {"_id": {"$in": [ObjectId()]}}, None),
+        ("filter_category", {"category": "glasses"}, None),
+        ("filter_brand", {"brand": "Ray-Ban"}, None),
+        ("filter_colors", {"colors": "black"}, None),
+        ("filter_style", {"style": "aviator"}, None),
+        ("import_by_sku", {"sku": "SKU-0001"}, None)
+    ]
 
     @staticmethod
     def get_product_by_id(product_id):
         return db.products.find_one({"_id": product_id})
 
     @staticmethod
-    def search_products(query, category=None, brand=None, color=None, style=None):
-        search_filter = {}
-        if query:
-            search_filter['$or'] = [
-                {'name': {'$regex': query, '$options': 'i'}},
-                {'category': {'$regex': query, '$options': 'i'}},
-                {'description': {'$regex': query, '$options': 'i'}}
-            ]
-        if category:
-            search_filter['category'] = category
-        if brand:
-            search_filter['brand'] = brand
-        if color:
-            search_filter['colors'] = color
-        if style:
-            search_filter['style'] = style
-        return list(db.products.find(search_filter))
+    def find_products(search_filter=None, fields=None, after=None, limit=None):
+        query = dict(search_filter or {})
+        if after is not None:
+            query['_id'] = {'$gt': after}
+        projection = {field: 1 for field in fields} if fields else None
+        cursor = db.products.find(query, projection).sort('_id', 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    @staticmethod
+    def get_products_by_ids(product_ids, fields=None):
+        projection = {field: 1 for field in fields} if fields else None
+        products = {product['_id']: product for product in db.products.find({"_id": {"$in": list(product_ids)}}, projection)}
+        return [products[product_id] for product_id in product_ids if product_id in products]
+
+    @staticmethod
+    def search_products(query, category=None, brand=None, color=None, style=None, offset=0, limit=None):
+        filters = {"category": category, "brand": brand, "colors": color, "style": style}
+        return product_search.search(query, filters, offset, limit)
+
+    @staticmethod
+    def autocomplete(prefix, limit=10):
+        return product_search.autocomplete(prefix, limit)
 
     @staticmethod
     def add_product(product_data):
         product_data['created_at'] = datetime.utcnow()
-        return db.products.insert_one(product_data)
+        result = db.products.insert_one(product_data)
+        catalog_cache.invalidate()
+        product_search.upsert(product_data)
+        return result
 
     @staticmethod
     def update_product(product_id, update_data):
-        return db.products.update_one({"_id": product_id}, {"$set": update_data})
+        result = db.products.update_one({"_id": product_id}, {"$set": update_data})
+        catalog_cache.invalidate(product_id)
+        if result.modified_count:
+            product = db.products.find_one({"_id": product_id}, ProductSearchIndex.PROJECTION)
+            if product:
+                product_search.upsert(product)
+        return result
 
     @staticmethod
     def delete_product(product_id):
-        return db.products.delete_one({"_id": product_id})
+        result = db.products.delete_one({"_id": product_id})
+        catalog_cache.invalidate(product_id)
+        product_search.remove(product_id)
+        return result
 
 class Cart:
+    COLLECTION = 'carts'
+    # Required, not just an optimisation: add_item and bulk_update upsert by user_id and rely on the unique
+    # index to turn a racing second upsert into DuplicateKeyError instead of a second cart.
+    INDEXES = [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True)
+    ]
+    QUERY_PLANS = [
+        ("get_user_cart", {"user_id": "000000000000000000000000"}, None)
+    ]
+
     @staticmethod
     def get_user_cart(user_id):
         return db.carts.find_one({"user_id": user_id}) or {"user_id": user_id, "items": []}
@@ -87,20 +171,324 @@ class Cart:
             upsert=True
         )
 
+    @staticmethod
+    def _new_item(product_id, quantity):
+        return {
+            'product_id': product_id,
+            'quantity': quantity,
+            'added_at': ObjectId().generation_time.isoformat()
+        }
+
+    @staticmethod
+    def add_item(user_id, product_id, quantity):
+        now = datetime.utcnow()
+        cart = db.carts.find_one_and_update(
+            {"user_id": user_id, "items.product_id": product_id},
+            {"$inc": {"items.$.quantity": quantity}, "$set": {"updated_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if cart:
+            return cart
+        try:
+            return db.carts.find_one_and_update(
+                {"user_id": user_id, "items.product_id": {"$ne": product_id}},
+                {"$push": {"items": Cart._new_item(product_id, quantity)}, "$set": {"updated_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # user_id_unique rejected the upsert: a concurrent request added the item between the two updates.
+            return Cart.add_item(user_id, product_id, quantity)
+
+    @staticmethod
+    def set_item_quantity(user_id, product_id, quantity):
+        if quantity <= 0:
+            return Cart.remove_item(user_id, product_id)
+        cart = db.carts.find_one_and_update(
+            {"user_id": user_id, "items.product_id": product_id},
+            {"$set": {"items.$.quantity": quantity, "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        return cart or Cart.get_user_cart(user_id)
+
+    @staticmethod
+    def remove_item(user_id, product_id):
+        cart = db.carts.find_one_and_update(
+            {"user_id": user_id},
+            {"$pull": {"items": {"product_id": product_id}}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        return cart or {"user_id": user_id, "items": []}
+
+    @staticmethod
+    def bulk_update(user_id, items, replace=False):
+        now = datetime.utcnow()
+        try:
+            db.carts.update_one({"user_id": user_id}, {"$setOnInsert": {"items": []}}, upsert=True)
+        except DuplicateKeyError:
+            pass
+        # Ordered pairs: the first update hits an existing line, the second only matches when the line is missing.
+        operations = []
+        for item in items:
+            product_id, quantity = item['product_id'], item['quantity']
+            if replace and quantity <= 0:
+                operations.append(UpdateOne(
+                    {"user_id": user_id},
+                    {"$pull": {"items": {"product_id": product_id}}, "$set": {"updated_at": now}}
+                ))
+                continue
+            if replace:
+                update = {"$set": {"items.$.quantity": quantity, "updated_at": now}}
+            else:
+                update = {"$inc": {"items.$.quantity": quantity}, "$set": {"updated_at": now}}
+            operations.append(UpdateOne({"user_id": user_id, "items.product_id": product_id}, update))
+            operations.append(UpdateOne(
+                {"user_id": user_id, "items.product_id": {"$ne": product_id}},
+                {"$push": {"items": Cart._new_item(product_id, quantity)}, "$set": {"updated_at": now}}
+            ))
+        if operations:
+            db.carts.bulk_write(operations, ordered=True)
+        return Cart.get_user_cart(user_id)
+
+class CheckoutError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
 class Order:
+    COLLECTION = 'orders'
+    INDEXES = [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_id_created_at"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="status_created_at"),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at")
+    ]
+    LISTING_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+    QUERY_PLANS = [
+        ("list_user_orders", {"user_id": "000000000000000000000000"}, LISTING_SORT),
+        ("list_orders", {}, LISTING_SORT),
+        ("list_orders_by_status", {"status": "pending"}, LISTING_SORT),
+        ("summary", {"created_at": {"$gte": datetime(2000, 1, 1)}}, None),
+        ("update_order_status", {"_id": ObjectId()}, None)
+    ]
+    EPOCH = datetime(1970, 1, 1)
+    # None until the first checkout finds out whether the deployment supports transactions.
+    transactions_supported = None
+
+    @staticmethod
+    def checkout(user_id, shipping_address, payment_method):
+        if Order.transactions_supported is not False:
+            try:
+                with get_client().start_session() as session:
+                    order = session.with_transaction(
+                        lambda s: Order._checkout(user_id, shipping_address, payment_method, s)
+                    )
+                Order.transactions_supported = True
+                Order._after_checkout(order)
+                return order
+            except OperationFailure as e:
+                # 20 = IllegalOperation: standalone servers reject transactions.
+                if e.code != 20:
+                    raise
+                Order.transactions_supported = False
+            except (ConfigurationError, NotImplementedError):
+                Order.transactions_supported = False
+        order = Order._checkout(user_id, shipping_address, payment_method)
+        Order._after_checkout(order)
+        return order
+
+    @staticmethod
+    def _price_items(items, session=None):
+        try:
+            quantities = Counter()
+            for item in items:
+                quantities[ObjectId(item['product_id'])] += int(item['quantity'])
+        except (InvalidId, KeyError, TypeError, ValueError):
+            raise CheckoutError("Cart contains an invalid item")
+        products = {
+            product['_id']: product
+            for product in db.products.find(
+                {"_id": {"$in": list(quantities)}},
+                {"name": 1, "price": 1, "stock_quantity": 1},
+                session=session
+            )
+        }
+        lines = []
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                raise CheckoutError("Product not found", 404)
+            if quantity <= 0:
+                raise CheckoutError("Cart contains an invalid item")
+            unit_price = float(product.get('price', 0))
+            lines.append({
+                "product_id": str(product_id),
+                "name": product.get('name'),
+                "quantity": quantity,
+                "unit_price": unit_price,
+                "line_total": round(unit_price * quantity, 2),
+                # Products without a stock_quantity field are not stock-tracked.
+                "tracked": 'stock_quantity' in product
+            })
+        return lines
+
+    @staticmethod
+    def _checkout(user_id, shipping_address, payment_method, session=None):
+        now = datetime.utcnow()
+        # Claim the cart atomically so a concurrent checkout of the same cart sees it empty.
+        cart = db.carts.find_one_and_update(
+            {"user_id": user_id, "items.0": {"$exists": True}},
+            {"$set": {"items": [], "updated_at": now}},
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if not cart:
+            raise CheckoutError("Cart is empty")
+        reserved = []
+        def compensate():
+            # Only reached without a transaction: undo the reservations and give the items back.
+            for line in reserved:
+                db.products.update_one({"_id": ObjectId(line['product_id'])}, {"$inc": {"stock_quantity": line['quantity']}})
+            if reserved:
+                db.products.update_many(
+                    {"_id": {"$in": [ObjectId(line['product_id']) for line in reserved]}, "stock_quantity": {"$gt": 0}, "in_stock": False},
+                    {"$set": {"in_stock": True}}
+                )
+            db.carts.update_one({"user_id": user_id}, {"$push": {"items": {"$each": cart['items']}}})
+        try:
+            lines = Order._price_items(cart['items'], session)
+            tracked = [line for line in lines if line.pop('tracked')]
+            if session is not None:
+                if tracked:
+                    result = db.products.bulk_write([
+                        UpdateOne(
+                            {"_id": ObjectId(line['product_id']), "stock_quantity": {"$gte": line['quantity']}},
+                            {"$inc": {"stock_quantity": -line['quantity']}}
+                        )
+                        for line in tracked
+                    ], ordered=False, session=session)
+                    if result.modified_count != len(tracked):
+                        raise CheckoutError("Insufficient stock", 409)
+            else:
+                for line in tracked:
+                    result = db.products.update_one(
+                        {"_id": ObjectId(line['product_id']), "stock_quantity": {"$gte": line['quantity']}},
+                        {"$inc": {"stock_quantity": -line['quantity']}}
+                    )
+                    if result.modified_count != 1:
+                        raise CheckoutError(f"Insufficient stock for {line['name']}", 409)
+                    reserved.append(line)
+            order = {
+                "user_id": user_id,
+                "items": lines,
+                "shipping_address": shipping_address,
+                "payment_method": payment_method,
+                "total_amount": round(sum(line['line_total'] for line in lines), 2),
+                "status": "pending",
+                "created_at": now
+            }
+            if tracked:
+                db.products.update_many(
+                    {"_id": {"$in": [ObjectId(line['product_id']) for line in tracked]}, "stock_quantity": {"$lte": 0}},
+                    {"$set": {"in_stock": False}},
+                    session=session
+                )
+            # The order is written last: without a transaction, nothing after it can fail and leave it orphaned.
+            order['_id'] = db.orders.insert_one(order, session=session).inserted_id
+            return order
+        except Exception:
+            if session is None:
+                compensate()
+            raise
+
+    @staticmethod
+    def _after_checkout(order):
+        for line in order['items']:
+            catalog_cache.invalidate(line['product_id'])
+
     @staticmethod
-    def create_order(order_data):
-        order_data['created_at'] = datetime.utcnow()
-        order_data['status'] = 'pending'
-        return db.orders.insert_one(order_data)
+    def encode_cursor(order):
+        milliseconds = int((order['created_at'] - Order.EPOCH) / timedelta(milliseconds=1))
+        return f"{milliseconds}_{order['_id']}"
 
     @staticmethod
-    def get_user_orders(user_id):
-        return list(db.orders.find({"user_id": user_id}).sort("created_at", -1))
+    def decode_cursor(cursor):
+        milliseconds, order_id = cursor.split('_', 1)
+        return Order.EPOCH + timedelta(milliseconds=int(milliseconds)), ObjectId(order_id)
+
+    @staticmethod
+    def list_orders(user_id=None, status=None, since=None, until=None, cursor=None, limit=50):
+        query = {}
+        if user_id:
+            query['user_id'] = user_id
+        if status:
+            query['status'] = status
+        created_at = {}
+        if since:
+            created_at['$gte'] = since
+        if until:
+            created_at['$lt'] = until
+        if created_at:
+            query['created_at'] = created_at
+        if cursor:
+            # Keyset on (created_at, _id) so pages stay stable while new orders arrive.
+            before, before_id = Order.decode_cursor(cursor)
+            query['$or'] = [
+                {"created_at": {"$lt": before}},
+                {"created_at": before, "_id": {"$lt": before_id}}
+            ]
+        orders = list(db.orders.find(query).sort(Order.LISTING_SORT).limit(limit + 1))
+        next_cursor = Order.encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+        return orders[:limit], next_cursor
 
     @staticmethod
-    def get_all_orders():
-        return list(db.orders.find({}).sort("created_at", -1))
+    def summary(since=None, until=None, top=10):
+        created_at = {"$gte": since or datetime.utcnow() - timedelta(days=30)}
+        if until:
+            created_at['$lt'] = until
+        pipeline = [
+            {"$match": {"created_at": created_at}},
+            {"$facet": {
+                "by_status": [
+                    {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}}
+                ],
+                "revenue_by_day": [
+                    {"$match": {"status": {"$ne": "cancelled"}}},
+                    {"$group": {
+                        "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                        "revenue": {"$sum": "$total_amount"},
+                        "orders": {"$sum": 1}
+                    }},
+                    {"$sort": {"_id": 1}}
+                ],
+                "top_products": [
+                    {"$match": {"status": {"$ne": "cancelled"}}},
+                    {"$unwind": "$items"},
+                    {"$group": {
+                        "_id": "$items.product_id",
+                        "name": {"$first": "$items.name"},
+                        "quantity": {"$sum": "$items.quantity"},
+                        "revenue": {"$sum": "$items.line_total"}
+                    }},
+                    {"$sort": {"quantity": -1}},
+                    {"$limit": top}
+                ]
+            }}
+        ]
+        result = next(db.orders.aggregate(pipeline), {})
+        return {
+            "from": created_at['$gte'],
+            "to": created_at.get('$lt'),
+            "orders_by_status": {row['_id']: row['count'] for row in result.get('by_status', [])},
+            "revenue_by_day": [
+                {"date": row['_id'], "revenue": round(row['revenue'] or 0, 2), "orders": row['orders']}
+                for row in result.get('revenue_by_day', [])
+            ],
+            "top_products": [
+                {"product_id": row['_id'], "name": row.get('name'), "quantity": row['quantity'], "revenue": round(row['revenue'] or 0, 2)}
+                for row in result.get('top_products', [])
+            ]
+        }
 
     @staticmethod
     def update_order_status(order_id, status):
@@ -108,3 +496,43 @@ class Order:
             {"_id": order_id},
             {"$set": {"status": status, "updated_at": datetime.utcnow()}}
         )
+
+MODELS = (User, Product, Cart, Order)
+
+def ensure_indexes():
+    # Each collection is tried on its own so one conflicting index doesn't leave the rest unbuilt.
+    created, failed = {}, {}
+    # mongomock ignores partialFilterExpression, so a partial unique index (products.sku) would reject
+    # every second document without the field; those indexes are only built on a real server.
+    skip_partial = is_mock()
+    for model in MODELS:
+        try:
+            indexes = [index for index in model.INDEXES if not (skip_partial and 'partialFilterExpression' in index.document)]
+            created[model.COLLECTION] = db[model.COLLECTION].create_indexes(indexes)
+        except Exception as e:
+            failed[model.COLLECTION] = str(e)
+    return created, failed
+
+def _plan_stages(plan):
+    plan = plan.get('queryPlan', plan)
+    stages = [plan.get('stage')]
+    for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+        if child:
+            stages.extend(_plan_stages(child))
+    return stages
+
+def explain_queries():
+    report = []
+    for model in MODELS:
+        for name, query, sort in model.QUERY_PLANS:
+            cursor = db[model.COLLECTION].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            stages = _plan_stages(cursor.explain()['queryPlanner']['winningPlan'])
+            report.append({
+                "collection": model.COLLECTION,
+                "query": name,
+                "stages": stages,
+                "collection_scan": 'COLLSCAN' in stages
+            })
+    return report
@@ -0,0 +1,154 @@
+import os
+import threading
+from pymongo import MongoClient, monitoring
+from pymongo.errors import ConfigurationError
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+MOCK_SCHEME = 'mongomock://'
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.waiting = 0
+            self.pool_clears = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": self.created - self.closed,
+                "in_use": self.checked_out,
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "max_pool_size": client_options()["maxPoolSize"]
+            }
+
+    def _count(self, **changes):
+        with self._lock:
+            for name, delta in changes.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count(pool_clears=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count(created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count(closed=1)
+
+    def connection_check_out_started(self, event):
+        self._count(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._count(waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._count(waiting=-1, checked_out=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._count(checked_out=-1)
+
+pool_metrics = PoolMetrics()
+event_listeners = [pool_metrics]
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+def client_options():
+    return {
+        "maxPoolSize": int(os.getenv('MONGO_MAX_POOL_SIZE', 50)),
+        "minPoolSize": int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+        "maxIdleTimeMS": int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000)),
+        "waitQueueTimeoutMS": int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+        "serverSelectionTimeoutMS": int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 3000)),
+        "connectTimeoutMS": int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        "socketTimeoutMS": int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000))
+    }
+
+def get_client():
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+                if uri.startswith(MOCK_SCHEME):
+                    # In-memory stand-in for load tests and local runs; no pool or command events.
+                    if mongomock is None:
+                        raise ConfigurationError("MONGODB_URI uses mongomock:// but mongomock is not installed")
+                    _client = mongomock.MongoClient('mongodb://' + uri[len(MOCK_SCHEME):])
+                else:
+                    # connect=False defers socket creation to first use, so importing never blocks on the server.
+                    _client = MongoClient(
+                        uri,
+                        connect=False,
+                        event_listeners=event_listeners,
+                        **client_options()
+                    )
+                _client_pid = pid
+    return _client
+
+def is_mock():
+    return mongomock is not None and isinstance(get_client(), mongomock.MongoClient)
+
+def get_db():
+    return get_client().get_default_database(default=os.getenv('MONGODB_DATABASE', 'artify'))
+
+def ping():
+    get_client().admin.command('ping')
+
+def close_client():
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+def _after_fork_in_child():
+    # Pre-fork servers (gunicorn) must not share the parent's sockets; the child builds its own client.
+    global _client, _client_pid, _lock
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+    pool_metrics.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+class LazyDatabase:
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+    def __getitem__(self, name):
+        return get_db()[name]
+
+db = LazyDatabase()
@@ -1,45 +1,62 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Order, Cart
+from models import Order, CheckoutError
 from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
 
 order_bp = Blueprint('orders', __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 @order_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_order():
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
-        cart = Cart.get_user_cart(user_id)
-        items = cart.get('items', [])
-        if not items:
-            return jsonify({"error": "Cart is empty"}), 400
-        order_data = {
-            "user_id": user_id,
-            "items": items,
-            "shipping_address": data.get('shipping_address', {}),
-            "payment_method": data.get('payment_method', 'card'),
-            "total_amount": data.get('total_amount', 0)
-        }
-        result = Order.create_order(order_data)
-        Cart.update_cart(user_id, [])
+        data = request.get_json() or {}
+        # Totals are always computed server-side; any client-sent total_amount is ignored.
+        order = Order.checkout(
+            user_id,
+            data.get('shipping_address', {}),
+            data.get('payment_method', 'card')
+        )
         return jsonify({
             "message": "Order created successfully",
-            "order_id": str(result.inserted_id)
+            "order_id": str(order['_id']),
+            "total_amount": order['total_amount']
         }), 201
+    except CheckoutError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _order_listing_args():
+    limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    since = request.args.get('from')
+    until = request.args.get('to')
+    return {
+        "status": request.args.get('status'),
+        "since": datetime.fromisoformat(since) if since else None,
+        "until": datetime.fromisoformat(until) if until else None,
+        "cursor": request.args.get('cursor'),
+        "limit": limit
+    }
+
+def _order_listing(user_id=None):
+    try:
+        args = _order_listing_args()
+        orders, next_cursor = Order.list_orders(user_id=user_id, **args)
+    except (ValueError, InvalidId):
+        return jsonify({"error": "Invalid date or cursor"}), 400
+    return jsonify({"orders": orders, "next_cursor": next_cursor}), 200
+
 @order_bp.route('/my-orders', methods=['GET'])
 @jwt_required()
 def get_my_orders():
     try:
-        user_id = get_jwt_identity()
-        orders = Order.get_user_orders(user_id)
-        for order in orders:
-            order['_id'] = str(order['_id'])
-        return jsonify({"orders": orders}), 200
+        return _order_listing(get_jwt_identity())
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -47,10 +64,23 @@ def get_my_orders():
 @jwt_required()
 def get_all_orders():
     try:
-        orders = Order.get_all_orders()
-        for order in orders:
-            order['_id'] = str(order['_id'])
-        return jsonify({"orders": orders}), 200
+        return _order_listing()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@order_bp.route('/admin/summary', methods=['GET'])
+@jwt_required()
+def get_order_summary():
+    try:
+        since = request.args.get('from')
+        until = request.args.get('to')
+        top = max(1, min(request.args.get('top', 10, type=int), 100))
+        try:
+            since = datetime.fromisoformat(since) if since else None
+            until = datetime.fromisoformat(until) if until else None
+        except ValueError:
+            return jsonify({"error": "Invalid date"}), 400
+        return jsonify({"summary": Order.summary(since, until, top)}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import bcrypt
+
+class HashingBusy(Exception):
+    pass
+
+class PasswordHasher:
+    def __init__(self, rounds=None, workers=None, max_pending=None, timeout=None):
+        self.rounds = rounds or int(os.getenv('BCRYPT_ROUNDS', 12))
+        self.workers = workers or int(os.getenv('BCRYPT_WORKERS', min(4, os.cpu_count() or 1)))
+        self.max_pending = max_pending or int(os.getenv('BCRYPT_MAX_PENDING', self.workers * 4))
+        self.timeout = timeout or float(os.getenv('BCRYPT_TIMEOUT', 10))
+        # bcrypt releases the GIL while hashing, so a thread pool keeps it off the request threads.
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._completed = 0
+        self._rehashed = 0
+        self._total_seconds = 0.0
+
+    def hash(self, password):
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+
+    def verify(self, password, hashed):
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    def needs_rehash(self, hashed):
+        try:
+            return int(hashed.split(b'$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def record_rehash(self):
+        with self._lock:
+            self._rehashed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "rehashed": self._rehashed,
+                "avg_ms": round(self._total_seconds / self._completed * 1000, 2) if self._completed else 0.0
+            }
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingBusy("Too many authentication requests in progress")
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._timed, fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashingBusy("Authentication timed out, try again later")
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._completed += 1
+                self._total_seconds += time.perf_counter() - started
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+class LoginThrottle:
+    def __init__(self, max_per_ip=None, max_per_email=None, max_registrations_per_ip=None, window=None):
+        self.max_per_ip = max_per_ip or int(os.getenv('LOGIN_MAX_PER_IP', 20))
+        self.max_per_email = max_per_email or int(os.getenv('LOGIN_MAX_PER_EMAIL', 5))
+        self.max_registrations_per_ip = max_registrations_per_ip or int(os.getenv('REGISTER_MAX_PER_IP', 10))
+        self.window = window or float(os.getenv('LOGIN_WINDOW_SECONDS', 300))
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.blocked = 0
+
+    def check(self, ip, email=None):
+        # Returns seconds to wait, or None when the attempt may go ahead.
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            retry_after = max(
+                self._retry_after(('ip', ip), self.max_per_ip, now),
+                self._retry_after(('email', email.lower()), self.max_per_email, now) if email else 0.0
+            )
+            if retry_after > 0:
+                self.blocked += 1
+                return retry_after
+            return None
+
+    def check_registration(self, ip):
+        # Every registration runs bcrypt, so each attempt counts, successful or not.
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            retry_after = max(
+                self._retry_after(('ip', ip), self.max_per_ip, now),
+                self._retry_after(('register', ip), self.max_registrations_per_ip, now)
+            )
+            if retry_after > 0:
+                self.blocked += 1
+                return retry_after
+            self._attempts.setdefault(('register', ip), deque()).append(now)
+            return None
+
+    def record_failure(self, ip, email=None):
+        # Only failures count, so many users behind one address can still sign in.
+        now = time.monotonic()
+        with self._lock:
+            self._attempts.setdefault(('ip', ip), deque()).append(now)
+            if email:
+                self._attempts.setdefault(('email', email.lower()), deque()).append(now)
+
+    def reset(self, email):
+        with self._lock:
+            self._attempts.pop(('email', email.lower()), None)
+
+    def stats(self):
+        with self._lock:
+            return {"tracked_keys": len(self._attempts), "blocked": self.blocked}
+
+    def _retry_after(self, key, limit, now):
+        attempts = self._attempts.get(key)
+        if not attempts:
+            return 0.0
+        while attempts and now - attempts[0] > self.window:
+            attempts.popleft()
+        if len(attempts) < limit:
+            return 0.0
+        return self.window - (now - attempts[0])
+
+    def _sweep(self, now):
+        if now - self._last_sweep < self.window:
+            return
+        self._last_sweep = now
+        for key in [key for key, attempts in self._attempts.items() if not attempts or now - attempts[-1] > self.window]:
+            del self._attempts[key]
+
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
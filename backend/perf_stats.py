@@ -0,0 +1,25 @@
+import sys
+import numpy as np
+
+def latency_stats(durations, digits=3):
+    ms = np.asarray(durations) * 1000.0
+    return {
+        "mean_ms": round(float(ms.mean()), digits),
+        "p50_ms": round(float(np.percentile(ms, 50)), digits),
+        "p95_ms": round(float(np.percentile(ms, 95)), digits),
+        "p99_ms": round(float(np.percentile(ms, 99)), digits),
+        "max_ms": round(float(ms.max()), digits)
+    }
+
+def find_regressions(pairs, metric, threshold):
+    # pairs yields (label, current stats, baseline stats or None); every comparison is logged to stderr.
+    regressions = []
+    for label, stats, previous in pairs:
+        if not previous or not previous.get(metric):
+            continue
+        change = stats[metric] / previous[metric] - 1.0
+        line = f"{label} {metric[:-3]} {previous[metric]:.3f} -> {stats[metric]:.3f} ms ({change:+.1%})"
+        print(line, file=sys.stderr)
+        if change > threshold:
+            regressions.append(line)
+    return regressions
@@ -0,0 +1,183 @@
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from catalog_cache import catalog_cache
+from models import product_search
+from mongo import db
+
+REQUIRED_FIELDS = ('name', 'category', 'price', 'description')
+FLOAT_FIELDS = ('price',)
+INT_FIELDS = ('stock_quantity',)
+BOOL_FIELDS = ('in_stock',)
+LIST_FIELDS = ('colors', 'features')
+LIST_SEPARATOR = '|'
+MAX_REPORTED_ERRORS = 1000
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.last_line = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def to_dict(self, max_errors=None):
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "last_line": self.last_line,
+            "errors": self.errors if max_errors is None else self.errors[:max_errors]
+        }
+
+def _text_lines(stream):
+    for number, line in enumerate(stream):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8-sig' if number == 0 else 'utf-8')
+        yield line
+
+def iter_records(stream, fmt='jsonl'):
+    if fmt == 'csv':
+        reader = csv.DictReader(_text_lines(stream))
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(_text_lines(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f"Invalid JSON: {e}")
+
+def normalize(record):
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Record must be an object")
+    # CSV leaves empty cells as '', which means "not provided".
+    product = {key.strip(): value for key, value in record.items() if key and value not in ('', None)}
+    product.pop('created_at', None)
+    missing = [field for field in REQUIRED_FIELDS if field not in product]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    try:
+        for field in FLOAT_FIELDS:
+            if field in product:
+                product[field] = float(product[field])
+        for field in INT_FIELDS:
+            if field in product:
+                product[field] = int(product[field])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid number in field {field}")
+    for field in BOOL_FIELDS:
+        if isinstance(product.get(field), str):
+            product[field] = product[field].strip().lower() in ('1', 'true', 'yes', 'y')
+    for field in LIST_FIELDS:
+        if isinstance(product.get(field), str):
+            product[field] = [value.strip() for value in product[field].split(LIST_SEPARATOR) if value.strip()]
+    if '_id' in product:
+        try:
+            product['_id'] = ObjectId(str(product['_id']))
+        except InvalidId:
+            raise ValueError("Invalid _id")
+    elif 'sku' in product:
+        product['sku'] = str(product['sku'])
+    else:
+        raise ValueError("Either sku or _id is required")
+    return product
+
+def _upsert(product, now):
+    key = {"_id": product.pop('_id')} if '_id' in product else {"sku": product['sku']}
+    return key, UpdateOne(key, {"$set": product, "$setOnInsert": {"created_at": now}}, upsert=True)
+
+def _flush(batch, report):
+    if not batch:
+        return
+    lines = [line for line, _ in batch]
+    try:
+        result = db.products.bulk_write([operation for _, operation in batch], ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for write_error in details.get('writeErrors', []):
+            report.error(lines[write_error['index']], write_error.get('errmsg', 'Write failed'))
+    report.inserted += details.get('nUpserted', 0)
+    report.updated += details.get('nModified', 0)
+    report.unchanged += details.get('nMatched', 0) - details.get('nModified', 0)
+    report.last_line = lines[-1]
+
+def import_products(records, batch_size=500, resume_from=0, progress=None):
+    # Rows are upserts keyed by sku or _id, so re-running (or resuming from last_line) is idempotent.
+    report = ImportReport()
+    now = datetime.utcnow()
+    batch = []
+    keys = set()
+    try:
+        for line, record in records:
+            if line <= resume_from:
+                continue
+            report.processed += 1
+            try:
+                key, operation = _upsert(normalize(record), now)
+            except ValueError as e:
+                report.error(line, str(e))
+                continue
+            key = tuple(key.items())
+            # Two upserts of the same key in one unordered batch could race each other.
+            if len(batch) >= batch_size or key in keys:
+                _flush(batch, report)
+                batch, keys = [], set()
+                if progress:
+                    progress(report)
+            batch.append((line, operation))
+            keys.add(key)
+        _flush(batch, report)
+        if progress:
+            progress(report)
+    finally:
+        catalog_cache.invalidate()
+        product_search.mark_stale()
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import products from JSON Lines or CSV.")
+    parser.add_argument("path", help="Input file, or - for stdin")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--resume-from", type=int, default=0, help="Skip input lines up to and including this one")
+    args = parser.parse_args(argv)
+    fmt = args.format or ('csv' if args.path.endswith('.csv') else 'jsonl')
+    print(f"🚀 Importing products from {args.path}...")
+    def progress(report):
+        print(f"  line {report.last_line}: {report.inserted} inserted, {report.updated} updated, {report.failed} failed")
+    stream = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+    try:
+        report = import_products(iter_records(stream, fmt), args.batch_size, args.resume_from, progress)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+    for error in report.errors:
+        print(f"❌ line {error['line']}: {error['error']}")
+    summary = report.to_dict(max_errors=0)
+    print(f"✅ Import finished: {summary['processed']} rows, {summary['inserted']} inserted, "
+          f"{summary['updated']} updated, {summary['unchanged']} unchanged, {summary['failed']} failed")
+    return 1 if report.failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,60 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Product
+from catalog_cache import cached_json_response
+from product_import import import_products, iter_records
 from bson import ObjectId
+from bson.errors import InvalidId
+import os
 
 product_bp = Blueprint('products', __name__)
 
+MAX_PAGE_SIZE = int(os.getenv('PRODUCTS_MAX_PAGE_SIZE', 100))
+NDJSON_BATCH_SIZE = 100
+
+def _listing_args():
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor')
+    fields = request.args.get('fields')
+    if fields:
+        fields = tuple(sorted({field for field in (part.strip() for part in fields.split(',')) if field and not field.startswith('$')}))
+    return {
+        "limit": limit,
+        "cursor": cursor or None,
+        "fields": fields or None,
+        "format": request.args.get('format', 'json')
+    }
+
+def _ndjson_response(products):
+    def generate():
+        for product in products:
+            yield current_app.json.dumps(product) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _listing_response(key, args):
+    after = ObjectId(args['cursor']) if args['cursor'] else None
+    if args['format'] == 'ndjson':
+        # Rows are written as the PyMongo cursor yields them; nothing is buffered.
+        return _ndjson_response(Product.find_products(None, args['fields'], after, args['limit']))
+    if args['limit'] is None and after is None and args['fields'] is None:
+        def build():
+            return {"products": list(Product.find_products())}
+        return cached_json_response(key, build)
+    limit = args['limit'] or MAX_PAGE_SIZE
+    def build_page():
+        products = list(Product.find_products(None, args['fields'], after, limit + 1))
+        next_cursor = str(products[limit - 1]['_id']) if len(products) > limit else None
+        return {"products": products[:limit], "next_cursor": next_cursor}
+    return cached_json_response(key + (limit, args['cursor'], args['fields']), build_page)
+
 @product_bp.route('/', methods=['GET'])
 def get_products():
     try:
-        products = Product.get_all_products()
-        for product in products:
-            product['_id'] = str(product['_id'])
-        return jsonify({"products": products}), 200
+        return _listing_response(('products',), _listing_args())
+    except InvalidId:
+        return jsonify({"error": "Invalid cursor"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -23,21 +66,52 @@ def search_products():
         brand = request.args.get('brand')
         color = request.args.get('color')
         style = request.args.get('style')
-        products = Product.search_products(query, category, brand, color, style)
-        for product in products:
-            product['_id'] = str(product['_id'])
-        return jsonify({"products": products}), 200
+        args = _listing_args()
+        # Results are relevance-ranked, so the search cursor is an offset into the ranking.
+        if not (args['cursor'] or '0').isdigit():
+            return jsonify({"error": "Invalid cursor"}), 400
+        offset = int(args['cursor'] or 0)
+        limit = args['limit']
+        if args['format'] == 'ndjson':
+            ids = Product.search_products(query, category, brand, color, style, offset, limit).ids
+            return _ndjson_response(
+                product
+                for start in range(0, len(ids), NDJSON_BATCH_SIZE)
+                for product in Product.get_products_by_ids(ids[start:start + NDJSON_BATCH_SIZE], args['fields'])
+            )
+        def build():
+            result = Product.search_products(query, category, brand, color, style, offset, limit)
+            products = Product.get_products_by_ids(result.ids, args['fields'])
+            payload = {"products": products, "total": result.total, "facets": result.facets}
+            if limit:
+                payload["next_cursor"] = str(offset + limit) if offset + limit < result.total else None
+            return payload
+        return cached_json_response(('search', query, category, brand, color, style, offset, limit, args['fields']), build)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@product_bp.route('/autocomplete', methods=['GET'])
+def autocomplete():
+    try:
+        prefix = request.args.get('q', '')
+        limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+        return jsonify(Product.autocomplete(prefix, limit)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @product_bp.route('/<product_id>', methods=['GET'])
 def get_product(product_id):
     try:
-        product = Product.get_product_by_id(ObjectId(product_id))
-        if not product:
+        object_id = ObjectId(product_id)
+        def build():
+            product = Product.get_product_by_id(object_id)
+            if not product:
+                return None
+            return {"product": product}
+        response = cached_json_response(('product', str(object_id)), build)
+        if response is None:
             return jsonify({"error": "Product not found"}), 404
-        product['_id'] = str(product['_id'])
-        return jsonify({"product": product}), 200
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -57,6 +131,22 @@ def add_product():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@product_bp.route('/admin/import', methods=['POST'])
+@jwt_required()
+def import_product_feed():
+    try:
+        fmt = request.args.get('format')
+        if fmt is None:
+            fmt = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+        if fmt not in ('jsonl', 'csv'):
+            return jsonify({"error": "format must be jsonl or csv"}), 400
+        batch_size = min(max(request.args.get('batch_size', 500, type=int), 1), 5000)
+        resume_from = request.args.get('resume_from', 0, type=int)
+        report = import_products(iter_records(request.stream, fmt), batch_size, resume_from)
+        return jsonify(report.to_dict(max_errors=100)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @product_bp.route('/admin/<product_id>', methods=['PUT'])
 @jwt_required()
 def update_product(product_id):
@@ -0,0 +1,240 @@
+import math
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+SearchResult = namedtuple('SearchResult', ['ids', 'total', 'facets'])
+
+def tokenize(value):
+    if isinstance(value, (list, tuple)):
+        return [token for item in value for token in tokenize(item)]
+    if value is None:
+        return []
+    return TOKEN_RE.findall(str(value).lower())
+
+class ProductSearchIndex:
+    FIELD_WEIGHTS = {
+        "name": 3.0,
+        "brand": 2.0,
+        "category": 2.0,
+        "style": 1.5,
+        "colors": 1.0,
+        "features": 1.0,
+        "description": 1.0
+    }
+    FACET_FIELDS = ("category", "brand", "colors", "style")
+    PREFIX_WEIGHT = 0.5
+    PROJECTION = {field: 1 for field in FIELD_WEIGHTS}
+
+    def __init__(self, loader, refresh_interval=None):
+        self._loader = loader
+        self.refresh_interval = refresh_interval if refresh_interval is not None else float(os.getenv('SEARCH_INDEX_REFRESH', 300))
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._built_at = None
+        self._generation = 0
+        self._changes = None
+        self._reset()
+
+    def rebuild(self):
+        with self._build_lock:
+            self._rebuild()
+
+    def mark_stale(self):
+        with self._lock:
+            self._built_at = None
+            self._generation += 1
+
+    def upsert(self, document):
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((document['_id'], document))
+            # Before the first build there is nothing to patch; the build will read the write.
+            if self._built_at is None:
+                return
+            self._remove(document['_id'])
+            self._add(document)
+
+    def remove(self, doc_id):
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((doc_id, None))
+            if self._built_at is not None:
+                self._remove(doc_id)
+
+    def search(self, query, filters=None, offset=0, limit=None):
+        self._ensure_built()
+        return self._search(query, filters, offset, limit)
+
+    def autocomplete(self, prefix, limit=10):
+        self._ensure_built()
+        tokens = tokenize(prefix)
+        if not tokens:
+            return {"terms": [], "products": []}
+        with self._lock:
+            terms = self._expand(tokens[-1])
+            terms.sort(key=lambda token: -len(self._postings[token]))
+            matches = self._search(prefix, None, 0, limit).ids
+            return {
+                "terms": terms[:limit],
+                "products": [{"_id": str(doc_id), "name": self._names.get(doc_id)} for doc_id in matches]
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "documents": len(self._order),
+                "terms": len(self._postings),
+                "age": None if self._built_at is None else round(time.monotonic() - self._built_at, 1)
+            }
+
+    def _reset(self):
+        self._postings = defaultdict(dict)
+        self._doc_tokens = {}
+        self._doc_facets = {}
+        self._facets = {field: defaultdict(set) for field in self.FACET_FIELDS}
+        self._names = {}
+        self._order = {}
+        self._next_order = 0
+        self._vocabulary = None
+
+    def _ensure_built(self):
+        with self._lock:
+            built_at = self._built_at
+        if built_at is not None and time.monotonic() - built_at <= self.refresh_interval:
+            return
+        # One thread rebuilds; when an index exists the others keep reading it meanwhile.
+        if not self._build_lock.acquire(blocking=built_at is None):
+            return
+        try:
+            with self._lock:
+                built_at = self._built_at
+            if built_at is None or time.monotonic() - built_at > self.refresh_interval:
+                self._rebuild()
+        finally:
+            self._build_lock.release()
+
+    def _rebuild(self):
+        with self._lock:
+            generation = self._generation
+            self._changes = []
+        try:
+            documents = list(self._loader())
+        except Exception:
+            with self._lock:
+                self._changes = None
+            raise
+        with self._lock:
+            changes, self._changes = self._changes, None
+            self._reset()
+            for document in documents:
+                self._add(document)
+            # Writes that raced with the load are replayed on top of the snapshot.
+            for doc_id, document in changes:
+                self._remove(doc_id)
+                if document is not None:
+                    self._add(document)
+            self._built_at = time.monotonic() if generation == self._generation else None
+
+    def _search(self, query, filters, offset, limit):
+        with self._lock:
+            candidates = self._filtered(filters)
+            tokens = tokenize(query)
+            if tokens:
+                scores = self._score(tokens, candidates)
+                ranked = sorted(scores, key=lambda doc_id: (-scores[doc_id], self._order[doc_id]))
+            else:
+                ranked = sorted(candidates if candidates is not None else self._order, key=self._order.__getitem__)
+            facets = {field: dict(Counter(value for doc_id in ranked for value in self._doc_facets[doc_id].get(field, ())).most_common())
+                      for field in self.FACET_FIELDS}
+            page = ranked[offset:offset + limit] if limit else ranked[offset:]
+            return SearchResult(page, len(ranked), facets)
+
+    def _add(self, document):
+        doc_id = document['_id']
+        weights = defaultdict(float)
+        for field, weight in self.FIELD_WEIGHTS.items():
+            for token in tokenize(document.get(field)):
+                weights[token] += weight
+        for token, weight in weights.items():
+            self._postings[token][doc_id] = weight
+        facets = {}
+        for field in self.FACET_FIELDS:
+            values = document.get(field)
+            values = values if isinstance(values, list) else [values] if values is not None else []
+            facets[field] = values
+            for value in values:
+                self._facets[field][value].add(doc_id)
+        self._doc_tokens[doc_id] = set(weights)
+        self._doc_facets[doc_id] = facets
+        self._names[doc_id] = document.get('name')
+        self._order[doc_id] = self._next_order
+        self._next_order += 1
+        self._vocabulary = None
+
+    def _remove(self, doc_id):
+        for token in self._doc_tokens.pop(doc_id, ()):
+            postings = self._postings[token]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary = None
+        for field, values in self._doc_facets.pop(doc_id, {}).items():
+            for value in values:
+                ids = self._facets[field][value]
+                ids.discard(doc_id)
+                if not ids:
+                    del self._facets[field][value]
+        self._names.pop(doc_id, None)
+        self._order.pop(doc_id, None)
+
+    def _filtered(self, filters):
+        candidates = None
+        for field, value in (filters or {}).items():
+            if value is None or value == '':
+                continue
+            ids = self._facets[field].get(value, set())
+            candidates = set(ids) if candidates is None else candidates & ids
+        return candidates
+
+    def _expand(self, prefix):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect_left(self._vocabulary, prefix)
+        terms = []
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            terms.append(token)
+        return terms
+
+    def _score(self, tokens, candidates):
+        total_docs = len(self._order) or 1
+        scores = None
+        for position, token in enumerate(tokens):
+            # The last token is still being typed, so it also matches as a prefix.
+            expansions = {token: 1.0}
+            if position == len(tokens) - 1:
+                for term in self._expand(token):
+                    expansions.setdefault(term, self.PREFIX_WEIGHT)
+            token_scores = defaultdict(float)
+            for term, factor in expansions.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + total_docs / len(postings))
+                for doc_id, weight in postings.items():
+                    if candidates is None or doc_id in candidates:
+                        token_scores[doc_id] = max(token_scores[doc_id], factor * weight * idf)
+            if scores is None:
+                scores = dict(token_scores)
+            else:
+                scores = {doc_id: score + token_scores[doc_id] for doc_id, score in scores.items() if doc_id in token_scores}
+            if not scores:
+                return {}
+        return scores
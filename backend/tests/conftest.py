@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests run against the in-memory mongomock stand-in from requirements-dev.txt, never a real server.
+os.environ["MONGODB_URI"] = "mongomock://localhost/artify_test"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from ar_processing import FaceDetector, FrameBufferPool, LandmarkTracker, NUM_FACE_MESH_LANDMARKS
+
+class StubDetector:
+    def __init__(self):
+        self.buffers = FrameBufferPool()
+        self.calls = 0
+
+    def detect_face_landmarks(self, image, color_order='bgr'):
+        self.calls += 1
+        h, w = image.shape[:2]
+        rng = np.random.default_rng(0)
+        points = np.stack([rng.integers(w // 4, 3 * w // 4, NUM_FACE_MESH_LANDMARKS),
+                           rng.integers(h // 4, 3 * h // 4, NUM_FACE_MESH_LANDMARKS)], axis=1)
+        return points.astype(np.int32), 0.9
+
+def _frame(width, height):
+    return np.random.default_rng(1).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+def test_tracker_redetects_when_the_frame_size_changes():
+    detector = StubDetector()
+    tracker = LandmarkTracker(detector)
+    tracker.track(_frame(640, 480))
+    tracker.track(_frame(640, 480))
+    assert detector.calls == 1
+    landmarks, _ = tracker.track(_frame(1280, 720))
+    assert detector.calls == 2
+    assert landmarks.shape == (NUM_FACE_MESH_LANDMARKS, 2)
+    tracker.track(_frame(1280, 720))
+    assert detector.calls == 2
+
+class StubFaceMesh:
+    # Finds a face in every frame except those whose first pixel is zero.
+    def __init__(self):
+        self.inputs = []
+
+    def process(self, rgb):
+        self.inputs.append(rgb.shape)
+        if not rgb[0, 0].any():
+            return SimpleNamespace(multi_face_landmarks=None)
+        landmark = [SimpleNamespace(x=0.5, y=0.25, presence=0.8)] * NUM_FACE_MESH_LANDMARKS
+        return SimpleNamespace(multi_face_landmarks=[SimpleNamespace(landmark=landmark)])
+
+def _batch_detector():
+    # Skips __init__ so no MediaPipe graphs are built.
+    detector = object.__new__(FaceDetector)
+    detector.buffers = FrameBufferPool()
+    detector.face_mesh = StubFaceMesh()
+    return detector
+
+@pytest.mark.parametrize("stacked", [False, True])
+def test_batch_landmarks_shape_and_mesh_miss(stacked):
+    frames = [np.full((48, 64, 3), 255, dtype=np.uint8), np.zeros((48, 64, 3), dtype=np.uint8),
+              np.full((48, 64, 3), 255, dtype=np.uint8)]
+    if stacked:
+        frames = np.stack(frames)
+    detector = _batch_detector()
+    landmarks, confidences = detector.detect_face_landmarks_batch(frames)
+    assert landmarks.shape == (3, NUM_FACE_MESH_LANDMARKS, 2)
+    assert detector.face_mesh.inputs == [(48, 64, 3)] * 3
+    assert (landmarks[0] == [32, 12]).all() and (landmarks[2] == [32, 12]).all()
+    assert not landmarks[1].any()
+    assert np.allclose(confidences, [0.8, 0.0, 0.8])
@@ -0,0 +1,42 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+
+from ar_service import ARInferenceService
+
+class BrokenExecutor:
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, *args):
+        raise BrokenProcessPool("worker died")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+class WorkingExecutor:
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result({"face_detected": False})
+        return future
+
+def test_broken_pool_is_replaced_on_submit():
+    service = ARInferenceService(workers=1, max_pending=1)
+    broken, fresh = BrokenExecutor(), WorkingExecutor()
+    service._executor = broken
+
+    def start():
+        service._executor = fresh
+        return fresh
+    service.start = start
+    assert service.process(b"frame") == {"face_detected": False}
+    assert broken.shut_down and service._executor is fresh
+    assert service.stats()["restarts"] == 1
+    assert service.stats()["pending"] == 0
+
+def test_malformed_overlay_points_are_rejected():
+    from app import app
+    client = app.test_client()
+    for value in ("[1, 2", '{"a": 1}', "[[1, 2]]", '[["x", 1, 2]]', "[]", "[[true, 1, 2]]"):
+        response = client.post("/api/ar/process?overlay_points=" + value, data=b"frame")
+        assert response.status_code == 400
@@ -0,0 +1,126 @@
+import json
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from ar_processing import overlay_assets
+from ar_stream import TryOnSession
+
+def _session():
+    # Skips __init__ so no MediaPipe graphs are built; message handling doesn't need them.
+    session = object.__new__(TryOnSession)
+    session.overlay_points = None
+    session.asset_key = None
+    return session
+
+def test_client_points_do_not_touch_shared_assets():
+    overlay_assets.clear()
+    shared = overlay_assets.put("product:shared", points_3d=np.zeros((4, 3)))
+    session = _session()
+    reply = session.handle_message({"asset_key": "product:shared", "overlay_points": [[1.0, 2.0, 3.0]] * 8})
+    assert reply["cached"] is True
+    assert overlay_assets.get("product:shared") is shared
+    assert np.allclose(session.overlay_points, [1.0, 2.0, 3.0])
+
+def test_unknown_key_with_points_is_not_cached():
+    overlay_assets.clear()
+    session = _session()
+    session.handle_message({"asset_key": "custom", "overlay_points": [[0.0, 0.0, 1.0]]})
+    assert overlay_assets.get("custom") is None
+    assert session.overlay_points.shape == (1, 3)
+
+def test_rgb_frame_format_requires_dimensions():
+    session = _session()
+    session.frame_format = "encoded"
+    for message in ({"frame_format": "rgb"}, {"frame_format": "rgb", "width": "640", "height": 480},
+                    {"frame_format": "rgb", "width": 0, "height": 480}):
+        assert session.handle_message(message)["type"] == "error"
+        assert session.frame_format == "encoded"
+    reply = session.handle_message({"frame_format": "rgb", "width": 640, "height": 480})
+    assert reply == {"type": "config", "frame_format": "rgb"}
+    assert session.frame_size == (640, 480)
+
+def test_empty_overlay_points_clear_the_session_points():
+    session = _session()
+    session.handle_message({"overlay_points": [[0.0, 0.0, 1.0]]})
+    reply = session.handle_message({"overlay_points": []})
+    assert reply == {"type": "config", "overlay_points": 0}
+    assert session.overlay_points is None
+    session.handle_message({"asset_key": "custom", "overlay_points": []})
+    assert session.overlay_points is None
+
+def test_bad_max_mesh_faces_leaves_the_mode_unchanged():
+    from types import SimpleNamespace
+    session = _session()
+    session.multi_face = False
+    session._face_estimators = {"kept": object()}
+    detector = SimpleNamespace(max_mesh_faces=2, max_faces=4, reset_tracks=lambda: None)
+    session.tracker = SimpleNamespace(detector=detector)
+    reply = session.handle_message({"multi_face": True, "max_mesh_faces": "x"})
+    assert reply["type"] == "error"
+    assert session.multi_face is False and "kept" in session._face_estimators
+    reply = session.handle_message({"multi_face": True, "max_mesh_faces": 9})
+    assert reply == {"type": "config", "multi_face": True, "max_mesh_faces": 4}
+
+def test_non_string_asset_key_is_rejected():
+    session = _session()
+    reply = session.handle_message({"asset_key": 5})
+    assert reply["type"] == "error"
+    assert session.asset_key is None
+
+class _Closed(Exception):
+    pass
+
+class _FakeSocket:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    def receive(self, timeout=None):
+        if self.messages:
+            return self.messages.pop(0)
+        if timeout == 0:
+            return None
+        raise _Closed()
+
+    def send(self, data):
+        self.sent.append(json.loads(data))
+
+def test_stream_survives_bad_messages_and_frames():
+    from ar_routes import _stream
+
+    class FailingSession:
+        def handle_message(self, message):
+            raise AttributeError("boom")
+
+        def receive_frame(self):
+            pass
+
+        def process(self, frame):
+            if frame == b"bad":
+                raise RuntimeError("decode failed")
+            return {"type": "frame"}
+
+    ws = _FakeSocket(['{"asset_key": 5}', b"bad"])
+    with pytest.raises(_Closed):
+        _stream(ws, FailingSession())
+    assert [reply["type"] for reply in ws.sent] == ["error", "error"]
+    ws.messages = [b"good"]
+    with pytest.raises(_Closed):
+        _stream(ws, FailingSession())
+    assert ws.sent[-1] == {"type": "frame"}
+
+def test_stream_session_limit():
+    from ar_stream import StreamSessionLimit
+    limit = StreamSessionLimit(max_sessions=1)
+    assert limit.acquire()
+    assert not limit.acquire()
+    limit.release()
+    assert limit.acquire()
+    assert limit.stats() == {"max_sessions": 1, "active": 1, "rejected": 1}
+
+def test_status_reports_stream_sessions():
+    from app import app
+    stats = app.test_client().get("/api/ar/status").get_json()
+    assert set(stats["stream_sessions"]) == {"max_sessions", "active", "rejected"}
@@ -0,0 +1,50 @@
+import pytest
+
+import models
+from models import Cart
+from mongo import db
+
+USER_ID = "65f000000000000000000002"
+
+@pytest.fixture(autouse=True)
+def carts():
+    db.carts.drop()
+    db.carts.create_indexes(Cart.INDEXES)
+
+def _quantities():
+    carts = list(db.carts.find({"user_id": USER_ID}))
+    assert len(carts) == 1
+    return {item["product_id"]: item["quantity"] for item in carts[0]["items"]}
+
+def test_add_item_creates_then_increments():
+    Cart.add_item(USER_ID, "a", 1)
+    Cart.add_item(USER_ID, "a", 2)
+    Cart.add_item(USER_ID, "b", 1)
+    assert _quantities() == {"a": 3, "b": 1}
+
+def test_add_item_retries_when_a_concurrent_add_wins(monkeypatch):
+    collection = type(db.carts)
+    original = collection.find_one_and_update
+    calls = []
+    def racing(self, filter, update, *args, **kwargs):
+        calls.append(filter)
+        if len(calls) == 1:
+            result = original(self, filter, update, *args, **kwargs)
+            # Another request creates the cart with the same item between the two updates.
+            db.carts.insert_one({"user_id": USER_ID, "items": [Cart._new_item("a", 5)]})
+            return result
+        return original(self, filter, update, *args, **kwargs)
+    monkeypatch.setattr(collection, "find_one_and_update", racing)
+    Cart.add_item(USER_ID, "a", 1)
+    assert _quantities() == {"a": 6}
+
+def test_bulk_update_merges_and_replaces():
+    Cart.add_item(USER_ID, "a", 1)
+    Cart.bulk_update(USER_ID, [{"product_id": "a", "quantity": 2}, {"product_id": "b", "quantity": 1}])
+    assert _quantities() == {"a": 3, "b": 1}
+    Cart.bulk_update(USER_ID, [{"product_id": "a", "quantity": 0}, {"product_id": "b", "quantity": 4}], replace=True)
+    assert _quantities() == {"b": 4}
+
+def test_bulk_update_creates_the_cart():
+    Cart.bulk_update(USER_ID, [{"product_id": "a", "quantity": 2}])
+    assert _quantities() == {"a": 2}
@@ -0,0 +1,49 @@
+import pytest
+
+from flask_jwt_extended import create_access_token
+from app import app
+from catalog_cache import catalog_cache
+from mongo import db
+
+@pytest.fixture
+def client():
+    db.products.delete_many({})
+    catalog_cache.invalidate()
+    with app.app_context():
+        token = create_access_token(identity="admin")
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+def _add_product(client, name="Old"):
+    response = client.post("/api/products/admin/add", json={
+        "name": name, "category": "glasses", "price": 10.0, "description": "d"
+    })
+    return response.get_json()["product_id"]
+
+def test_update_clears_cached_product(client):
+    product_id = _add_product(client)
+    assert client.get(f"/api/products/{product_id}").get_json()["product"]["name"] == "Old"
+    assert client.put(f"/api/products/admin/{product_id}", json={"name": "New"}).status_code == 200
+    assert client.get(f"/api/products/{product_id}").get_json()["product"]["name"] == "New"
+
+def test_delete_clears_cached_product(client):
+    product_id = _add_product(client)
+    assert client.get(f"/api/products/{product_id}").status_code == 200
+    assert client.delete(f"/api/products/admin/{product_id}").status_code == 200
+    assert client.get(f"/api/products/{product_id}").status_code == 404
+
+def test_invalidate_keeps_other_products():
+    catalog_cache.invalidate()
+    for key in (("product", "a", "json"), ("product", "a", "msgpack"), ("product", "b", "json"), ("search", "q", "json")):
+        catalog_cache.get_or_build(key, lambda: (b"{}", "application/json"))
+    catalog_cache.invalidate("a")
+    assert catalog_cache.get(("product", "a", "json")) is None
+    assert catalog_cache.get(("product", "a", "msgpack")) is None
+    assert catalog_cache.get(("product", "b", "json")) is not None
+    assert catalog_cache.get(("search", "q", "json")) is None
+
+def test_listing_fields_ignore_operators():
+    from product_routes import _listing_args
+    with app.test_request_context("/api/products/?fields=name,%20$where"):
+        assert _listing_args()["fields"] == ("name",)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from ar_processing import HeadPoseEstimator, NUM_FACE_MESH_LANDMARKS, slerp_rvec
+
+def _rotation_error_degrees(rvec_a, rvec_b):
+    relative = cv2.Rodrigues(np.asarray(rvec_a, dtype=np.float64).reshape(3, 1))[0].T @ \
+        cv2.Rodrigues(np.asarray(rvec_b, dtype=np.float64).reshape(3, 1))[0]
+    return np.degrees(np.arccos(np.clip((np.trace(relative) - 1) / 2, -1, 1)))
+
+def test_slerp_handles_sign_flipped_rvecs_near_pi():
+    a = np.array([np.pi - 0.01, 0.0, 0.0])
+    b = np.array([-(np.pi - 0.01), 0.0, 0.0])
+    assert _rotation_error_degrees(slerp_rvec(a, b, 0.5), a) < 1.0
+
+def test_smoothing_survives_opposite_form_after_reset_seed():
+    estimator = HeadPoseEstimator(smoothing=0.5)
+    camera_matrix = estimator.camera_matrix_for(640, 480)
+    true_rvec = np.array([[np.pi - 0.05], [0.05], [0.0]])
+    tvec = np.array([[0.0], [0.0], [1500.0]])
+    points, _ = cv2.projectPoints(estimator.face_3d_model, true_rvec, tvec, camera_matrix, None)
+    landmarks = np.zeros((NUM_FACE_MESH_LANDMARKS, 2))
+    landmarks[HeadPoseEstimator.KEY_POINT_INDICES] = points.reshape(-1, 2)
+    # Previous pose stored in the equivalent opposite-sign form, with the seed dropped.
+    angle = np.linalg.norm(true_rvec)
+    estimator._pose = (-true_rvec / angle * (2 * np.pi - angle), tvec)
+    estimator._seed = None
+    rvec, _ = estimator.estimate_pose(landmarks, camera_matrix)
+    assert _rotation_error_degrees(rvec, true_rvec) < 2.0
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+
+from model_assets import CATEGORY_PLACEMENTS, fit_anchors
+
+ANCHORS = {
+    "center": [0.0, 1.0, 0.0],
+    "min": [-7.0, -1.5, -7.0],
+    "max": [7.0, 3.5, 7.0],
+    "named": {"left": [-7.0, 1.0, 0.0], "right": [7.0, 1.0, 0.0]},
+    "points": [[-7.0, -1.5, -7.0], [7.0, 3.5, 7.0]]
+}
+
+def test_glasses_fit_head_model_eye_line():
+    fitted = fit_anchors(ANCHORS, "sunglasses")
+    placement = CATEGORY_PLACEMENTS["sunglasses"]
+    width = fitted["max"][0] - fitted["min"][0]
+    assert width == pytest.approx(placement["fit"][1])
+    assert fitted["center"][1] == pytest.approx(placement["at"][1])
+    assert fitted["max"][2] == pytest.approx(placement["at"][2])
+    assert fitted["frame"] == "head_model"
+
+def test_product_override_wins():
+    fitted = fit_anchors(ANCHORS, "hats", {"scale": 2.0, "translation": [1.0, 2.0, 3.0]})
+    assert np.allclose(fitted["named"]["right"], [15.0, 4.0, 3.0])
@@ -0,0 +1,22 @@
+import pytest
+
+import models
+from mongo import db
+
+def test_ensure_indexes_keeps_going_after_a_failing_collection(monkeypatch):
+    for model in models.MODELS:
+        db[model.COLLECTION].drop_indexes()
+    monkeypatch.setattr(models.Product, "INDEXES", [object()])
+    created, failed = models.ensure_indexes()
+    assert list(failed) == [models.Product.COLLECTION]
+    assert set(created) == {model.COLLECTION for model in models.MODELS} - {models.Product.COLLECTION}
+    assert len(db[models.Order.COLLECTION].index_information()) > 1
+
+def test_products_without_sku_can_coexist_on_mongomock():
+    db.products.drop()
+    created, failed = models.ensure_indexes()
+    assert not failed
+    assert "sku" not in created[models.Product.COLLECTION]
+    db.products.insert_one({"name": "First"})
+    db.products.insert_one({"name": "Second"})
+    assert db.products.count_documents({}) == 2
@@ -0,0 +1,68 @@
+import pytest
+
+from flask_jwt_extended import create_access_token
+from app import app
+from mongo import db
+
+USER_ID = "65f000000000000000000001"
+
+@pytest.fixture
+def client():
+    for name in ("products", "carts", "orders"):
+        db[name].delete_many({})
+    with app.app_context():
+        token = create_access_token(identity=USER_ID)
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+def _product(price, stock):
+    return str(db.products.insert_one({"name": f"Frame {price}", "price": price, "stock_quantity": stock, "in_stock": True}).inserted_id)
+
+def _fill_cart(*items):
+    db.carts.insert_one({"user_id": USER_ID, "items": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in items]})
+
+def _checkout(client, **extra):
+    return client.post("/api/orders/", json={"shipping_address": {"city": "Testville"}, "payment_method": "card", **extra})
+
+def test_total_is_computed_on_the_server(client):
+    a, b = _product(19.99, 10), _product(5.5, 10)
+    _fill_cart((a, 2), (b, 3))
+    response = _checkout(client, total_amount=0.01)
+    assert response.status_code == 201
+    assert response.get_json()["total_amount"] == 56.48
+    assert db.orders.find_one()["total_amount"] == 56.48
+    assert db.products.find_one({"price": 19.99})["stock_quantity"] == 8
+
+def test_insufficient_stock_restores_stock_and_cart(client):
+    plenty, scarce = _product(10.0, 5), _product(20.0, 1)
+    _fill_cart((plenty, 2), (scarce, 2))
+    response = _checkout(client)
+    assert response.status_code == 409
+    assert db.products.find_one({"price": 10.0})["stock_quantity"] == 5
+    assert db.products.find_one({"price": 20.0})["stock_quantity"] == 1
+    assert len(db.carts.find_one({"user_id": USER_ID})["items"]) == 2
+    assert db.orders.count_documents({}) == 0
+
+def test_same_cart_checks_out_once(client):
+    product = _product(10.0, 5)
+    _fill_cart((product, 1))
+    assert _checkout(client).status_code == 201
+    assert _checkout(client).status_code == 400
+    assert db.orders.count_documents({}) == 1
+    assert db.products.find_one()["stock_quantity"] == 4
+
+def test_failed_stock_flag_update_leaves_no_order(client, monkeypatch):
+    product = _product(10.0, 1)
+    _fill_cart((product, 1))
+    collection = type(db.products)
+    original = collection.update_many
+    def failing(self, *args, **kwargs):
+        if self.name == "products" and kwargs.get("session", "unset") is None:
+            raise RuntimeError("write failed")
+        return original(self, *args, **kwargs)
+    monkeypatch.setattr(collection, "update_many", failing)
+    assert _checkout(client).status_code == 500
+    assert db.orders.count_documents({}) == 0
+    assert db.products.find_one()["stock_quantity"] == 1
+    assert len(db.carts.find_one({"user_id": USER_ID})["items"]) == 1
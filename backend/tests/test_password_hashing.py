@@ -0,0 +1,31 @@
+import threading
+import pytest
+
+from password_hashing import HashingBusy, LoginThrottle, PasswordHasher
+
+def test_successful_attempts_do_not_count_against_the_address():
+    throttle = LoginThrottle(max_per_ip=2, max_per_email=5, window=60)
+    for _ in range(10):
+        assert throttle.check("10.0.0.1", "a@example.com") is None
+    throttle.record_failure("10.0.0.1", "a@example.com")
+    throttle.record_failure("10.0.0.1")
+    assert throttle.check("10.0.0.1", "b@example.com") > 0
+    assert throttle.check("10.0.0.2", "a@example.com") is None
+
+def test_every_registration_counts_against_the_address():
+    throttle = LoginThrottle(max_per_ip=20, max_registrations_per_ip=3, window=60)
+    for _ in range(3):
+        assert throttle.check_registration("10.0.0.1") is None
+    assert throttle.check_registration("10.0.0.1") > 0
+    assert throttle.check_registration("10.0.0.2") is None
+    assert throttle.check("10.0.0.1", "a@example.com") is None
+
+def test_hash_timeout_raises_hashing_busy():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=2, timeout=0.05)
+    release = threading.Event()
+    hasher._executor.submit(release.wait)
+    try:
+        with pytest.raises(HashingBusy):
+            hasher.hash("secret")
+    finally:
+        release.set()
@@ -0,0 +1,53 @@
+import threading
+import time
+import pytest
+
+import models
+from mongo import db
+from search_index import ProductSearchIndex
+
+def test_concurrent_searches_share_one_rebuild():
+    loads = []
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return [{"_id": 1, "name": "Round Glasses"}]
+    index = ProductSearchIndex(loader, refresh_interval=300)
+    threads = [threading.Thread(target=index.search, args=("round",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert index.search("round").ids == [1]
+
+def test_writes_during_rebuild_are_kept():
+    index = ProductSearchIndex(lambda: [{"_id": 1, "name": "Round Glasses"}], refresh_interval=300)
+    def loader():
+        index.upsert({"_id": 2, "name": "Round Hat"})
+        return [{"_id": 1, "name": "Round Glasses"}]
+    index._loader = loader
+    assert sorted(index.search("round").ids) == [1, 2]
+
+def test_change_stream_events_patch_the_index(monkeypatch):
+    db.products.delete_many({})
+    doc_id = db.products.insert_one({"name": "Aviator Sunglasses", "stock_quantity": 5}).inserted_id
+    index = ProductSearchIndex(lambda: db.products.find({}, ProductSearchIndex.PROJECTION))
+    monkeypatch.setattr(models, "product_search", index)
+    index.rebuild()
+    built_at = index._built_at
+
+    db.products.update_one({"_id": doc_id}, {"$set": {"stock_quantity": 4}})
+    models.sync_product_search({"operationType": "update", "documentKey": {"_id": doc_id},
+                                "updateDescription": {"updatedFields": {"stock_quantity": 4}}})
+    db.products.update_one({"_id": doc_id}, {"$set": {"name": "Pilot Sunglasses"}})
+    models.sync_product_search({"operationType": "update", "documentKey": {"_id": doc_id},
+                                "updateDescription": {"updatedFields": {"name": "Pilot Sunglasses"}}})
+    assert index._built_at == built_at
+    assert index.search("pilot").ids == [doc_id]
+    assert index.search("aviator").ids == []
+
+    db.products.delete_one({"_id": doc_id})
+    models.sync_product_search({"operationType": "delete", "documentKey": {"_id": doc_id}})
+    assert index.search("pilot").ids == []
+    assert index._built_at == built_at